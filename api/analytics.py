@@ -0,0 +1,146 @@
+"""
+Item analysis of a quiz across every finished session it was run in.
+
+Answer facts are loaded with one query and turned into student x question arrays, so the
+statistics for all questions are computed together instead of one query per question.
+"""
+
+from typing import Optional
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import AnswerFact, QuestionMultipleChoice, QuizSession
+
+# Results are keyed by the latest end_time, so a stale entry is never read; this only
+# bounds how long unused entries are kept.
+ITEM_ANALYSIS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _rounded(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _item_statistics(question_ids, rows):
+    """
+    p-values, point-biserial discrimination and per-choice selection counts of the
+    questions, from (student_id, question_id, choice, is_correct) rows in the order they
+    were written.
+    """
+    question_count = len(question_ids)
+    if not rows:
+        nan = np.full(question_count, np.nan)
+        return np.zeros(question_count, dtype=int), nan, nan, [], np.zeros((question_count, 0))
+
+    student_ids, row_question_ids, answers, is_correct = (np.array(column) for column in zip(*rows))
+    _, student_index = np.unique(student_ids, return_inverse=True)
+    question_index = np.searchsorted(question_ids, row_question_ids)
+    student_count = student_index.max() + 1
+
+    # Keep each student's last answer to a question.
+    cell = student_index * question_count + question_index
+    _, last = np.unique(cell[::-1], return_index=True)
+    latest = len(cell) - 1 - last
+    student_index, question_index = student_index[latest], question_index[latest]
+
+    answered = np.zeros((student_count, question_count))
+    answered[student_index, question_index] = 1
+    correct = np.zeros((student_count, question_count))
+    correct[student_index, question_index] = is_correct[latest].astype(bool)
+
+    responses = answered.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_values = correct.sum(axis=0) / responses
+
+        # Point-biserial correlation between getting a question right and the score on the
+        # student's other answered questions, over the students who answered it.
+        rest = correct.sum(axis=1, keepdims=True) - correct
+        mean_correct = p_values
+        mean_rest = (rest * answered).sum(axis=0) / responses
+        covariance = ((correct - mean_correct) * (rest - mean_rest) * answered).sum(
+            axis=0
+        ) / responses
+        variance_correct = ((correct - mean_correct) ** 2 * answered).sum(axis=0) / responses
+        variance_rest = ((rest - mean_rest) ** 2 * answered).sum(axis=0) / responses
+        discrimination = covariance / np.sqrt(variance_correct * variance_rest)
+
+    labels, answer_index = np.unique(answers[latest], return_inverse=True)
+    selections = np.zeros((question_count, len(labels)))
+    np.add.at(selections, (question_index, answer_index.ravel()), 1)
+    return (
+        responses.astype(int),
+        p_values,
+        discrimination,
+        [int(label) for label in labels],
+        selections,
+    )
+
+
+def item_analysis(quiz_id) -> dict:
+    """
+    Per-question difficulty (p-value: share of correct answers), discrimination (point-biserial
+    correlation with the rest of the student's score) and selection rate of every choice, over
+    all finished sessions of the quiz. Cached until another session of the quiz ends.
+    """
+    sessions = QuizSession.objects.filter(quiz_id=quiz_id, end_time__isnull=False)
+    finished = sessions.aggregate(count=Count("id"), latest_end_time=Max("end_time"))
+    latest_end_time = finished["latest_end_time"]
+    cache_key = (
+        f"item_analysis:{quiz_id}:{finished['count']}:"
+        f"{latest_end_time.isoformat() if latest_end_time else None}"
+    )
+    result: Optional[dict] = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    questions = list(
+        QuestionMultipleChoice.objects.filter(quiz_id=quiz_id)
+        .order_by("id")
+        .only("id", "question_text", "correct_answer", "incorrect_answer_list", "choice_history")
+    )
+    QuestionMultipleChoice.record_choice_histories(questions)
+    question_ids = [question.id for question in questions]
+    rows = list(
+        AnswerFact.objects.filter(quiz_session__in=sessions, question_id__in=question_ids)
+        .order_by("id")
+        .values_list("student_id", "question_id", "choice", "is_correct")
+    )
+    responses, p_values, discrimination, labels, selections = _item_statistics(
+        np.array(question_ids, dtype=np.int64), rows
+    )
+
+    items = []
+    for index, question in enumerate(questions):
+        selected = {
+            label: int(selections[index, label_index]) for label_index, label in enumerate(labels)
+        }
+        # Answers that are not among the current choices count towards responses only.
+        counts = {
+            choice: selected.get(question.choice_id(choice), 0)
+            for choice in question.answer_choices()
+        }
+        total = int(responses[index])
+        items.append(
+            {
+                "question_id": question.id,
+                "question_text": question.question_text,
+                "correct_answer": question.correct_answer,
+                "responses": total,
+                "p_value": _rounded(p_values[index]),
+                "discrimination": _rounded(discrimination[index]),
+                "selection_rates": {
+                    choice: round(count / total, 4) if total else None
+                    for choice, count in counts.items()
+                },
+            }
+        )
+
+    result = {
+        "quiz_id": quiz_id,
+        "session_count": finished["count"],
+        "latest_end_time": latest_end_time,
+        "questions": items,
+    }
+    cache.set(cache_key, result, ITEM_ANALYSIS_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,86 @@
+"""
+JSON encoding shared by the websocket consumers and the REST API.
+
+orjson is used when it is installed and the standard library otherwise; both produce the
+same compact output. datetime, date, time, UUID and Decimal values are encoded natively,
+so payload builders can hand over model fields as they are.
+"""
+
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from django.http import HttpResponse
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder as DRFJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without the optional dependency
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    # Lazy translations, querysets and the other types DRF knows how to flatten.
+    return DRFJSONEncoder().default(obj)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode()
+
+    def loads(data):
+        return orjson.loads(data)
+
+else:
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, default=_default, separators=(",", ":"))
+
+    def dumps_bytes(obj) -> bytes:
+        return dumps(obj).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+class JsonResponse(HttpResponse):
+    """django.http.JsonResponse encoded with the codec."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps_bytes(data), **kwargs)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps_bytes(data)
+
+
+class JSONParser(parsers.JSONParser):
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
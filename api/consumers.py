@@ -1,30 +1,279 @@
-import json
+import asyncio
 import logging
 from collections import defaultdict
+from typing import List, Tuple
 from urllib.parse import parse_qs
 
+from channels.consumer import AsyncConsumer
 from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
-from django.db.models import Count
-from django.utils import timezone
+from django.db.models import Count, Q
+from django.http import Http404
 from rest_framework.authtoken.models import Token
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import UntypedToken
 
 from api.models import (
-    QuestionMultipleChoice,
     QuizSession,
     QuizSessionQuestion,
     QuizSessionStudent,
-    UserResponse,
 )
 
-from .serializers import QuizSerializer
-from .services import score_session
+from . import codec
+from .live_session import (
+    get_live_session,
+    get_running_live_session_or_404,
+    invalidate_live_session,
+    peek_live_session,
+)
+from .services import grade_distribution, score_session, summarize_session
 
 logger = logging.getLogger(__name__)
 
+GRADING_CHANNEL = "grading"
+
+_flush_tasks = {}
+_answer_updates = {}
+_grading_tasks = {}
+
+
+def _track_task(tasks, code, coroutine):
+    """Run ``coroutine`` as the task held in ``tasks[code]`` until it finishes."""
+    task = asyncio.ensure_future(coroutine)
+    tasks[code] = task
+
+    def forget(done):
+        if tasks.get(code) is done:
+            del tasks[code]
+
+    task.add_done_callback(forget)
+    return task
+
+
+async def broadcast(group, message_type, text=None, **fields):
+    """
+    Send one frame to every consumer in ``group``. The frame is encoded here, once, and
+    recipients forward ``event["text"]`` as is instead of each encoding the same event.
+    """
+    if text is None:
+        text = codec.dumps({"type": message_type, **fields})
+    await get_channel_layer().group_send(group, {"type": message_type, "text": text})
+
+
+async def flush_responses(code):
+    """Write the session's buffered answers to the database."""
+    await database_sync_to_async(lambda: get_live_session(code).flush_responses())()
+
+
+def _flush_loaded_responses(code):
+    # A session invalidated since the flush was scheduled has written its answers already;
+    # loading it here would bring the ended session back into the state store.
+    live_session = peek_live_session(code)
+    if live_session is not None:
+        live_session.flush_responses()
+
+
+async def _flush_responses_later(code):
+    await asyncio.sleep(settings.ANSWER_FLUSH_INTERVAL)
+    try:
+        await database_sync_to_async(_flush_loaded_responses)(code)
+    except Exception:
+        logger.exception(f"Failed to flush buffered answers for session {code}")
+
+
+def schedule_response_flush(code):
+    """Make sure a flush of the session's buffered answers is pending in this process."""
+    task = _flush_tasks.get(code)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        _track_task(_flush_tasks, code, _flush_responses_later(code))
+
+
+def _answer_update_events(code, new_responses):
+    live_session = peek_live_session(code)
+    if live_session is None:
+        return []
+    events = []
+    for question_id, count in new_responses.items():
+        event = {
+            "message_type": "update_answers",
+            "question_id": question_id,
+            "new_responses": count,
+        }
+        if live_session.live_bar_chart:
+            event["data"] = live_session.tally(question_id)
+        events.append(event)
+    return events
+
+
+async def _send_answer_updates_later(code, pending):
+    await asyncio.sleep(1 / settings.ANSWER_UPDATES_PER_SECOND)
+    if _answer_updates.get(code) is pending:
+        del _answer_updates[code]
+    try:
+        events = await database_sync_to_async(_answer_update_events)(code, pending["new_responses"])
+        for event in events:
+            await broadcast(f"quiz_session_instructor_{code}", **event)
+    except Exception:
+        logger.exception(f"Failed to send answer updates for session {code}")
+
+
+def queue_answer_update(code, question_id):
+    """
+    Coalesce answer notifications so the instructor receives at most
+    ANSWER_UPDATES_PER_SECOND update_answers frames per question from this process.
+    """
+    pending = _answer_updates.get(code)
+    if pending is None or pending["task"].get_loop() is not asyncio.get_running_loop():
+        pending = {"new_responses": defaultdict(int)}
+        pending["task"] = asyncio.ensure_future(_send_answer_updates_later(code, pending))
+        _answer_updates[code] = pending
+    pending["new_responses"][question_id] += 1
+
+
+def _cancel_delayed_work(code):
+    """Drop this process's pending flush and answer updates for a session that has ended."""
+    running_loop = asyncio.get_running_loop()
+    tasks = [_flush_tasks.pop(code, None), (_answer_updates.pop(code, None) or {}).get("task")]
+    for task in tasks:
+        if task is not None and task.get_loop() is running_loop:
+            task.cancel()
+
+
+def _grades_frame(session_id) -> str:
+    try:
+        distribution = grade_distribution(session_id)
+    except ValueError:
+        return codec.dumps(
+            {
+                "type": "quiz_ended",
+                "grades": {"error": "No questions in the quiz."},
+                "statistics": None,
+            }
+        )
+    grades = {bucket["percentage"]: bucket["usernames"] for bucket in distribution["buckets"]}
+    return codec.dumps(
+        {"type": "quiz_ended", "grades": grades, "statistics": distribution["statistics"]}
+    )
+
+
+def _scores(session_id):
+    try:
+        return score_session(session_id)
+    except ValueError:
+        # Every question was skipped (or none was served): there is nothing to grade, which no
+        # retry changes. The grade_distribution step sends the instructor the error frame.
+        return {}
+
+
+async def _grade_attempt(code, session_id, attempt):
+    steps = [
+        ("flushing_answers", lambda: get_live_session(code).flush_responses()),
+        ("scoring", lambda: _scores(session_id)),
+        ("summarizing", lambda: summarize_session(session_id)),
+        ("grade_distribution", lambda: _grades_frame(session_id)),
+    ]
+    results = {}
+    for step, (stage, work) in enumerate(steps, start=1):
+        progress = {"stage": stage, "step": step, "steps": len(steps), "attempt": attempt}
+        text = codec.dumps({"type": "grading_progress", **progress})
+        await broadcast(f"quiz_session_{code}", "grading_progress", text)
+        await broadcast(f"quiz_session_instructor_{code}", "grading_progress", text)
+        results[stage] = await database_sync_to_async(work)()
+    return results
+
+
+def _personal_grade_frames(code, session_id, scores) -> List[Tuple[str, str]]:
+    """The grade frame for every graded student connected by websocket, with their channel."""
+    counts = QuizSessionQuestion.objects.filter(quiz_session_id=session_id).aggregate(
+        question_count=Count("id"), skipped=Count("id", filter=Q(skipped=True))
+    )
+    return [
+        (
+            channel_name,
+            codec.dumps({"type": "grade", "grade": scores[student_id], **counts}),
+        )
+        for student_id, channel_name in get_live_session(code).student_channels().items()
+        if student_id in scores
+    ]
+
+
+async def _send_personal_grades(code, session_id, scores):
+    channel_layer = get_channel_layer()
+    frames = await database_sync_to_async(_personal_grade_frames)(code, session_id, scores)
+    for channel_name, text in frames:
+        try:
+            await channel_layer.send(channel_name, {"type": "grade", "text": text})
+        except ChannelFull:
+            logger.warning(f"Could not push a grade to {channel_name} in session {code}")
+
+
+async def grade_session(code, session_id):
+    """
+    Flush, score and summarise a finished session, streaming grading_progress to the
+    student and instructor groups. Failed attempts are retried up to GRADING_MAX_ATTEMPTS
+    times; the live session is only dropped once grading succeeded, so no buffered answer
+    is lost to a failure.
+    """
+    students, instructor = f"quiz_session_{code}", f"quiz_session_instructor_{code}"
+    await broadcast(students, "grading_started")
+    await broadcast(instructor, "grading_started")
+    logger.info(f"Grading started for session {code}")
+
+    for attempt in range(1, settings.GRADING_MAX_ATTEMPTS + 1):
+        try:
+            results = await _grade_attempt(code, session_id, attempt)
+            break
+        except Exception as e:
+            logger.exception(f"Grading attempt {attempt} failed for session {code}")
+            if attempt == settings.GRADING_MAX_ATTEMPTS:
+                for group in (students, instructor):
+                    await broadcast(group, "grading_failed", message=str(e))
+                return
+            await asyncio.sleep(settings.GRADING_RETRY_DELAY * attempt)
+
+    # Students hold their own grade before grading_completed, so none of them asks for it.
+    await _send_personal_grades(code, session_id, results["scoring"])
+    await broadcast(students, "grading_completed")
+    await broadcast(instructor, "quiz_ended", results["grade_distribution"])
+    logger.info(f"Grading completed for session {code}")
+    await database_sync_to_async(invalidate_live_session)(code)
+
+
+async def enqueue_grading(code, session_id):
+    """
+    Hand a finished session to the grader: the ``grading`` channel worker
+    (``manage.py runworker grading``) or, with GRADING_BACKEND "local", a task in this process.
+    Grading writes the buffered answers itself, so delayed flushes are cancelled first.
+    """
+    _cancel_delayed_work(code)
+    if settings.GRADING_BACKEND == "worker":
+        await get_channel_layer().send(
+            GRADING_CHANNEL, {"type": "grade_session", "code": code, "session_id": session_id}
+        )
+    else:
+        _track_task(_grading_tasks, code, grade_session(code, session_id))
+
+
+class GradingConsumer(AsyncConsumer):
+    async def grade_session(self, message):
+        await grade_session(message["code"], message["session_id"])
+
+
+def next_question_frame(live_session, question_id, order=None) -> str:
+    """Student next_question frame built around the session's pre-encoded question payload."""
+    frame = (
+        f'{{"type": "next_question", '
+        f'"question": {live_session.student_question_json(question_id)}, '
+        f'"quiz_session": {codec.dumps(live_session.to_json())}'
+    )
+    if order is not None:
+        frame += f', "order": {codec.dumps(order)}'
+    return frame + "}"
+
 
 class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -39,25 +288,22 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
         uc = await self.fetch_user_count()
 
         await self.send(
-            text_data=json.dumps({"type": "quiz_details", "quiz": quiz_data, "user_count": uc})
+            text_data=codec.dumps({"type": "quiz_details", "quiz": quiz_data, "user_count": uc})
         )
 
     @database_sync_to_async
     def fetch_user_count(self):
-        session = QuizSession.objects.get(code=self.code)
-        return session.students.count()
+        return get_live_session(self.code).user_count
 
     @database_sync_to_async
     def get_quiz_json(self):
-        data = QuizSerializer(QuizSession.objects.get(code=self.code).quiz).data
-        data["instructor_recording"] = str(data["instructor_recording"])
-        return data
+        return get_live_session(self.code).quiz_json
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = codec.loads(text_data)
         if "type" in data:
             if data["type"] == "next_question":
                 await self.send_next_question()
@@ -81,22 +327,25 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
     async def send_student_question_and_order(self, data):
         order = data.get("order")
         if order:
-            await self.channel_layer.group_send(
-                f"quiz_session_{self.code}",
-                {
-                    "type": "next_question",
-                    "question": await self.fetch_current_question(),
-                    "quiz_session": await self.fetch_quiz_session(),
-                    "order": order,
-                },
-            )
+            group = f"quiz_session_{self.code}"
+            if settings.QUIZ_PRELOAD_BUNDLE:
+                # Students already hold every question from the preload bundle.
+                question = await self.fetch_current_question()
+                await broadcast(group, "next_question", question_id=question["id"], order=order)
+            else:
+                await broadcast(group, "next_question", await self.fetch_question_frame(order))
+
+    @database_sync_to_async
+    def fetch_question_frame(self, order):
+        live_session = get_live_session(self.code)
+        return next_question_frame(live_session, live_session.current_question_id, order)
 
     async def delete_student(self, student_id):
         try:
             response = await self.delete_student_from_db(student_id)
             if response.get("status") == "success":
                 await self.send(
-                    text_data=json.dumps(
+                    text_data=codec.dumps(
                         {
                             "type": "student_deleted",
                             "message": "Student deleted successfully",
@@ -106,7 +355,7 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
                 )
             else:
                 await self.send(
-                    text_data=json.dumps(
+                    text_data=codec.dumps(
                         {
                             "type": "error",
                             "message": "Failed to delete student.",
@@ -116,7 +365,7 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
                 )
         except Exception as e:
             await self.send(
-                text_data=json.dumps(
+                text_data=codec.dumps(
                     {
                         "type": "error",
                         "message": "An error occurred: " + str(e),
@@ -127,46 +376,29 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def delete_student_from_db(self, id):
-        session = QuizSession.objects.get(code=self.code)
-        student = QuizSessionStudent.objects.get(quiz_session=session, id=id)
-        student.delete()
+        get_live_session(self.code).remove_student(id)
         return {"status": "success", "student_id": id}
 
     async def send_current_question(self):
         question_data = await self.fetch_current_question()
         if question_data:
             await self.send(
-                text_data=json.dumps({"type": "current_question", "question": question_data})
+                text_data=codec.dumps({"type": "current_question", "question": question_data})
             )
 
     @database_sync_to_async
     def fetch_current_question(self):
-        session = QuizSession.objects.get(code=self.code)
-        if session.current_question:
-            return session.current_question.to_json()
-        return None
+        return get_live_session(self.code).current_question()
 
     @database_sync_to_async
     def fetch_next_question(self):
-        session = QuizSession.objects.get(code=self.code)
-        served_questions_ids = session.served_questions.values_list("id", flat=True)
-        next_question = (
-            QuestionMultipleChoice.objects.exclude(id__in=served_questions_ids)
-            .filter(quiz=session.quiz)
-            .first()
-        )
-        if next_question:
-            session.served_questions.add(next_question)
-            session.current_question = next_question
-            session.save()
-            return next_question.to_json()
-        return None
+        return get_live_session(self.code).advance()
 
     async def send_next_question(self):
         question_data = await self.fetch_next_question()
         if question_data:
             await self.send(
-                text_data=json.dumps({"type": "next_question", "question": question_data})
+                text_data=codec.dumps({"type": "next_question", "question": question_data})
             )
         else:
             print("Ending Quiz")
@@ -176,107 +408,40 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
     def update_quiz_end_time(self):
         print("Updating end time for quiz with code", self.code)
         try:
-            session = QuizSession.objects.get(code=self.code)
-            session.end_time = timezone.now()
-            session.save()
+            get_live_session(self.code).end()
             return True
         except QuizSession.DoesNotExist:
             print("No quiz session found with the code:", self.code)
             return False
 
-    async def run_grading(self):
-        try:
-            await self.channel_layer.group_send(
-                f"quiz_session_{self.code}",
-                {"type": "quiz_ended"},
-            )
-            logger.info(f"Quiz ended for session {self.code}")
-
-            await self.channel_layer.group_send(
-                f"quiz_session_{self.code}",
-                {"type": "grading_started"},
-            )
-            logger.info(f"Grading started for session {self.code}")
-
-            session = await database_sync_to_async(QuizSession.objects.get)(code=self.code)
-
-            await database_sync_to_async(score_session)(session.id)
-            logger.info(f"Scoring completed for session {self.code}")
-
-            await self.channel_layer.group_send(
-                f"quiz_session_{self.code}",
-                {"type": "grading_completed"},
-            )
-            logger.info(f"Grading completed for session {self.code}")
-
-        except QuizSession.DoesNotExist:
-            logger.error(f"QuizSession with code {self.code} does not exist.")
-        except Exception as e:
-            logger.error(f"An error occurred while ending the quiz for session {self.code}: {e}")
-
     async def end_quiz(self):
         if await self.update_quiz_end_time():
-            grades = await self.fetch_grades()
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "quiz_ended",
-                        "grades": grades,
-                    }
-                )
-            )
-
-            await self.run_grading()
+            await broadcast(f"quiz_session_{self.code}", "quiz_ended")
+            # Grading runs in the background; this consumer keeps serving messages and
+            # receives grading_progress, then quiz_ended with the grades.
+            await enqueue_grading(self.code, await self.fetch_session_id())
         else:
             print("Failed to end the quiz; session not found.")
 
-    async def fetch_grades(self):
-        try:
-            session = await database_sync_to_async(QuizSession.objects.get)(code=self.code)
-            session_id = session.id
-            await database_sync_to_async(score_session)(session_id)
-            students = await database_sync_to_async(
-                lambda: list(
-                    QuizSessionStudent.objects.filter(quiz_session_id=session_id).values(
-                        "username", "score"
-                    )
-                )
-            )()
-
-            question_count = await database_sync_to_async(
-                QuizSessionQuestion.objects.filter(quiz_session_id=session_id, skipped=False).count
-            )()
-
-            if question_count == 0:
-                return {"error": "No questions in the quiz."}
-
-            def score_to_percentage(score):
-                return round((score / question_count) * 100, 2)
-
-            grade_buckets = defaultdict(list)
-            for student in students:
-                percentage = score_to_percentage(student["score"])
-                grade_buckets[percentage].append(student["username"])
-
-            return grade_buckets
-        except QuizSession.DoesNotExist:
-            logger.error(f"Quiz session with code {self.code} does not exist.")
-            return {"error": "Quiz session not found."}
-        except Exception as e:
-            logger.exception("An error occurred while fetching grades.")
-            return {"error": str(e)}
+    @database_sync_to_async
+    def fetch_preload_bundle(self):
+        return get_live_session(self.code).preload_bundle_json()
 
     async def start_quiz(self):
-        await self.channel_layer.group_send(f"quiz_session_{self.code}", {"type": "quiz_started"})
+        text = None
+        if settings.QUIZ_PRELOAD_BUNDLE:
+            bundle = await self.fetch_preload_bundle()
+            text = f'{{"type": "quiz_started", "bundle": {bundle}}}'
+        await broadcast(f"quiz_session_{self.code}", "quiz_started", text)
 
         await self.send(
-            text_data=json.dumps({"type": "quiz_started", "message": "Quiz has started!"})
+            text_data=codec.dumps({"type": "quiz_started", "message": "Quiz has started!"})
         )
 
     async def student_joined(self, event):
-        event_message = json.loads(event["text"])
+        event_message = codec.loads(event["text"])
         await self.send(
-            text_data=json.dumps(
+            text_data=codec.dumps(
                 {
                     "type": "student_joined",
                     "username": event_message["username"],
@@ -287,70 +452,43 @@ class QuizSessionInstructorConsumer(AsyncWebsocketConsumer):
         )
 
     @database_sync_to_async
-    def fetch_quiz_session(self):
-        session = QuizSession.objects.get(code=self.code)
-        return session.to_json()
-
-    async def user_response(self, event):
-        await self.send(
-            text_data=json.dumps({"type": "user_response", "response": event["response"]})
-        )
-
-    @database_sync_to_async
-    def fetch_question_results(self, question_id):
-        responses = UserResponse.objects.filter(
-            quiz_session__code=self.code, question_id=question_id
-        )
-
-        total_responses = responses.count()
-        answer_data = responses.values("selected_answer").annotate(count=Count("selected_answer"))
-        answer_counts = {item["selected_answer"]: item["count"] for item in answer_data}
+    def fetch_session_id(self):
+        return get_live_session(self.code).session_id
 
-        return {"total_responses": total_responses, "answers": answer_counts}
+    async def forward_frame(self, event):
+        await self.send(text_data=event["text"])
 
-    async def update_answers(self, event):
-        results = await self.fetch_question_results(event["question_id"])
-        await self.send(text_data=json.dumps({"type": "update_answers", "data": results}))
+    update_answers = forward_frame
+    grading_started = forward_frame
+    grading_progress = forward_frame
+    grading_failed = forward_frame
+    quiz_ended = forward_frame
 
     @database_sync_to_async
     def add_to_duration_db(self, question_id, extension: int):
-        quiz_session_question = QuizSessionQuestion.objects.get(
-            quiz_session__code=self.code, question__id=question_id
-        )
-        quiz_session_question.extension += extension
-        quiz_session_question.save()
-        return quiz_session_question
+        return get_live_session(self.code).extend_question(question_id, extension)
 
     @database_sync_to_async
     def skip_question_db(self, question_id):
-        quiz_session_question = QuizSessionQuestion.objects.get(
-            question__id=question_id, quiz_session__code=self.code
-        )
-        quiz_session_question.skipped = True
-        quiz_session_question.unlocked = False
-        quiz_session_question.save()
+        get_live_session(self.code).skip_question(question_id)
 
     async def skip_question(self, question_id):
         await self.skip_question_db(question_id)
         await self.send_next_question()
 
     async def add_to_duration(self, question_id, extension: int):
-        quiz_session_question = await self.add_to_duration_db(question_id, extension)
+        timing = await self.add_to_duration_db(question_id, extension)
         response = {
             "type": "time_extended",
-            "question_opened_at": quiz_session_question.opened_at.isoformat(),
-            "extension": quiz_session_question.extension,
+            "question_opened_at": timing["opened_at"],
+            "extension": timing["extension"],
         }
-        await self.send(text_data=json.dumps(response))
+        await self.send(text_data=codec.dumps(response))
 
     @database_sync_to_async
     def update_opened_at(self, question_id):
-        quiz_session_question = QuizSessionQuestion.objects.get(
-            question__id=question_id, quiz_session__code=self.code
-        )
-        quiz_session_question.opened_at = timezone.now()
-        quiz_session_question.save()
-        return json.dumps({"type": "question_timer_started", "status": "success"})
+        get_live_session(self.code).open_question(question_id)
+        return codec.dumps({"type": "question_timer_started", "status": "success"})
 
     async def question_timer_started(self, data):
         result = await self.update_opened_at(data["question_id"])
@@ -377,8 +515,18 @@ class StudentConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    def running_live_session(self):
+        """
+        The live state of this consumer's session, or None when the session is not running.
+        Students connect anonymously, so a guessed code must not load a session that ended.
+        """
+        try:
+            return get_running_live_session_or_404(self.code)
+        except Http404:
+            return None
+
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = codec.loads(text_data)
         message_type = data.get("type")
 
         if message_type == "join":
@@ -394,88 +542,82 @@ class StudentConsumer(AsyncWebsocketConsumer):
             await self.process_student_user_join()
 
     async def submit_response(self, data):
-        response = await self.create_user_response(data)
+        response, pending = await self.create_user_response(data)
+        await self.send(text_data=codec.dumps(response))
 
         if response["status"] == "success":
-            await self.channel_layer.group_send(
-                f"quiz_session_instructor_{self.code}",
-                {
-                    "type": "update_answers",
-                    "question_id": response["question_id"],
-                },
-            )
-            await self.channel_layer.group_send(
-                f"quiz_session_instructor_{self.code}",
-                {
-                    "type": "user_response",
-                    "response": data.get("data").get("selected_answer"),
-                },
-            )
-        await self.send(text_data=json.dumps(response))
-
-    def is_question_open(self, question: QuestionMultipleChoice):
-        try:
-            quiz_session_question = QuizSessionQuestion.objects.get(
-                question=question, quiz_session__code=self.code
-            )
-        except QuizSessionQuestion.DoesNotExist:
-            logger.warn(
-                f"Attempt to check if non existant question is open. question_id={question.id} session_code={self.code}"
-            )
-            return False
-        except QuizSessionQuestion.MultipleObjectsReturned:
-            logger.error(
-                f"Multiple QuizSessionQuestion objects returned for unique combination. \
-                question_id={question.id} session_code={self.code}"
-            )
-            return False
-
-        if quiz_session_question.unlocked is False:
-            return False
-        extension = quiz_session_question.extension
-        adjusted_open_time = quiz_session_question.opened_at.timestamp() + extension
-        return timezone.now().timestamp() - adjusted_open_time <= question.duration
+            queue_answer_update(self.code, int(response["question_id"]))
+            if pending >= settings.ANSWER_FLUSH_BATCH_SIZE:
+                await flush_responses(self.code)
+            else:
+                schedule_response_flush(self.code)
 
     @database_sync_to_async
     def create_user_response(self, data):
         data = data["data"]
         student_data = data.get("student", {})
         student_id = student_data.get("id")
-        student = QuizSessionStudent.objects.get(id=student_id)
-        question = QuestionMultipleChoice.objects.get(id=data["question_id"])
         selected_answer = data.get("selected_answer")
-        quiz_session = QuizSession.objects.get(code=data["quiz_session_code"])
+        live_session = self.running_live_session()
 
-        if not self.is_question_open(question):
+        # Grading writes the queued answers once; answers after the end would not be graded.
+        if live_session is None:
             return {
-                "type": "question_locked",
+                "type": "error",
                 "status": "failed",
-                "question_id": question.id,
-            }
+                "message": "The quiz has ended",
+                "question_id": data["question_id"],
+            }, 0
 
-        is_correct = selected_answer == question.correct_answer
+        question = live_session.question(data["question_id"])
+        if question is None or not live_session.has_student(student_id):
+            return {
+                "type": "error",
+                "status": "failed",
+                "message": "Unknown student or question for this session",
+                "question_id": data["question_id"],
+            }, 0
+
+        # Clients may send the index of the answer in the question's choices instead of its text.
+        if data.get("choice") is not None:
+            selected_answer = live_session.choice_text(question["id"], data["choice"])
+            if selected_answer is None:
+                return {
+                    "type": "error",
+                    "status": "failed",
+                    "message": "Unknown choice for this question",
+                    "question_id": data["question_id"],
+                }, 0
+
+        if not live_session.is_question_open(question["id"]):
+            return {
+                "type": "question_locked",
+                "status": "failed",
+                "question_id": question["id"],
+            }, 0
 
-        user_response, _ = UserResponse.objects.update_or_create(
-            student=student,
-            quiz_session=quiz_session,
-            question=question,
-            defaults={"selected_answer": selected_answer, "is_correct": is_correct},
+        is_correct = selected_answer == question["correct_answer"]
+        pending = live_session.buffer_response(
+            student_id, question["id"], selected_answer, is_correct
         )
 
         return {
             "type": "answer",
             "status": "success",
             "message": "User response created successfully",
-            "response_id": user_response.id,
             "question_id": data["question_id"],
             "selected_answer": selected_answer,
-        }
+            "choice": live_session.choice_index(question["id"], selected_answer),
+        }, pending
 
     @database_sync_to_async
-    def create_student_session_entry(self, username, code):
+    def create_student_session_entry(self, username):
+        live_session = self.running_live_session()
+        if live_session is None:
+            return {"status": "closed", "message": "This quiz session is not running."}
         try:
-            session = QuizSession.objects.get(code=code)
-            student = QuizSessionStudent.objects.create(username=username, quiz_session=session)
+            student = live_session.add_student(username)
+            live_session.connect_student(student.id, self.channel_name)
             self.student = student
             return {
                 "status": "success",
@@ -487,12 +629,15 @@ class StudentConsumer(AsyncWebsocketConsumer):
 
     async def process_student_join(self, data):
         username = data.get("username")
-        response = await self.create_student_session_entry(username, self.code)
+        response = await self.create_student_session_entry(username)
+        if response["status"] == "closed":
+            await self.reject_join(response["message"])
+            return
 
         if response["status"] == "success":
             self.student_id = response["student_id"]
             await self.send(
-                text_data=json.dumps(
+                text_data=codec.dumps(
                     {
                         "type": "success",
                         "message": "Student joined successfully",
@@ -505,10 +650,14 @@ class StudentConsumer(AsyncWebsocketConsumer):
                 f"quiz_session_instructor_{self.code}",
                 {
                     "type": "student_joined",
-                    "text": json.dumps({"username": username, "student_id": self.student_id}),
+                    "text": codec.dumps({"username": username, "student_id": self.student_id}),
                 },
             )
 
+    async def reject_join(self, message):
+        await self.send(text_data=codec.dumps({"type": "error", "message": message}))
+        await self.close()
+
     async def process_student_user_join(self):
         if self.user is None:
             await self.close()
@@ -518,11 +667,15 @@ class StudentConsumer(AsyncWebsocketConsumer):
         first_name = self.user.first_name
         last_name = self.user.last_name
         username = f"{first_name} {last_name}"
-        response = await self.create_student_session_entry(username, self.code)
+        response = await self.create_student_session_entry(username)
+        if response["status"] == "closed":
+            await self.reject_join(response["message"])
+            return
+
         if response["status"] == "success":
             self.student_id = response["student_id"]
             await self.send(
-                text_data=json.dumps(
+                text_data=codec.dumps(
                     {
                         "type": "success",
                         "message": "Student joined successfully",
@@ -535,27 +688,25 @@ class StudentConsumer(AsyncWebsocketConsumer):
                 f"quiz_session_instructor_{self.code}",
                 {
                     "type": "student_joined",
-                    "text": json.dumps({"username": username, "student_id": self.student_id}),
+                    "text": codec.dumps({"username": username, "student_id": self.student_id}),
                 },
             )
 
-    async def next_question(self, event):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "next_question",
-                    "question": event["question"],
-                    "quiz_session": event["quiz_session"],
-                    "order": event["order"],
-                }
-            )
-        )
+    async def forward_frame(self, event):
+        # Session broadcasts arrive encoded by broadcast(); pass them through untouched.
+        await self.send(text_data=event["text"])
 
-    async def quiz_started(self, event):
-        await self.send(text_data=json.dumps({"type": "quiz_started"}))
+    next_question = forward_frame
+    quiz_started = forward_frame
+    quiz_ended = forward_frame
+    grading_started = forward_frame
+    grading_progress = forward_frame
+    grading_completed = forward_frame
+    grading_failed = forward_frame
+    grade = forward_frame
 
     async def time_extended(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.send(text_data=codec.dumps(event))
 
     @database_sync_to_async
     def get_student(self, student_id):
@@ -581,7 +732,7 @@ class StudentConsumer(AsyncWebsocketConsumer):
         question_count, skipped = await self.get_question_count_and_skipped()
         if response.get("status") == "success":
             await self.send(
-                text_data=json.dumps(
+                text_data=codec.dumps(
                     {
                         "type": "grade",
                         "grade": response.get("grade"),
@@ -601,78 +752,42 @@ class StudentConsumer(AsyncWebsocketConsumer):
         student = QuizSessionStudent.objects.get(quiz_session=session, id=student_id)
         return {"status": "success", "grade": student.score}
 
-    async def quiz_ended(self, event):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "quiz_ended",
-                }
-            )
-        )
-
-    async def grading_started(self, event):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "grading_started",
-                }
-            )
-        )
-
-    async def grading_completed(self, event):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "grading_completed",
-                }
-            )
-        )
-
     @database_sync_to_async
-    def fetch_quiz_session(self):
-        session = QuizSession.objects.get(code=self.code)
-        return session.to_json()
+    def fetch_current_question_frames(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.current_question_id
+        if question_id is None:
+            return [codec.dumps({"type": "no_active_question"})]
 
-    @database_sync_to_async
-    def fetch_current_question(self):
-        session = QuizSession.objects.get(code=self.code)
-        if session.current_question:
-            return session.current_question.to_json()
-        return None
+        if not settings.QUIZ_PRELOAD_BUNDLE:
+            return [next_question_frame(live_session, question_id)]
 
-    async def send_current_question_to_student(self):
-        quiz_session = await self.fetch_quiz_session()
-        current_question = await self.fetch_current_question()
+        order = live_session.question_colors.get(str(question_id))
+        return [
+            f'{{"type": "quiz_started", "bundle": {live_session.preload_bundle_json()}}}',
+            codec.dumps({"type": "next_question", "question_id": question_id, "order": order}),
+        ]
 
-        if current_question:
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "next_question",
-                        "question": current_question,
-                        "quiz_session": quiz_session,
-                    }
-                )
-            )
-        else:
-            await self.send(text_data=json.dumps({"type": "no_active_question"}))
+    async def send_current_question_to_student(self):
+        for frame in await self.fetch_current_question_frames():
+            await self.send(text_data=frame)
 
     @database_sync_to_async
-    def get_student_by_id(self, id):
-        try:
-            student = QuizSessionStudent.objects.get(id=id, quiz_session__code=self.code)
-            return student
-        except QuizSessionStudent.DoesNotExist:
+    def student_in_session(self, id):
+        live_session = self.running_live_session()
+        in_session = live_session is not None and live_session.has_student(id)
+        if not in_session:
             logger.warning("Attempted to retrieve a student that doesn't exist")
-            return None
+        else:
+            live_session.connect_student(id, self.channel_name)
+        return in_session
 
     async def process_student_reconnect(self, student_id):
         logger.info(f"Student with id {student_id} requested a reconnect")
 
-        student = await self.get_student_by_id(student_id)
-        if student is None:
+        if not await self.student_in_session(student_id):
             await self.send(
-                text_data=json.dumps(
+                text_data=codec.dumps(
                     {
                         "type": "reconnect_failed",
                         "status": "error",
@@ -682,11 +797,10 @@ class StudentConsumer(AsyncWebsocketConsumer):
             )
             return
 
-        self.student = student
         self.student_id = student_id
 
         await self.send(
-            text_data=json.dumps(
+            text_data=codec.dumps(
                 {
                     "type": "reconnect_success",
                 }
@@ -748,7 +862,7 @@ class RecordingConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         logger.debug(f"Received WebSocket message: {text_data}")
         try:
-            data = json.loads(text_data)
+            data = codec.loads(text_data)
             message_type = data.get("type")
 
             if message_type == "transcript_completed":
@@ -766,7 +880,7 @@ class RecordingConsumer(AsyncWebsocketConsumer):
                     # Send error if required fields are missing
                     error_message = "Invalid data: recording_id and transcript_url are required."
                     logger.error(error_message)
-                    await self.send(text_data=json.dumps({"error": error_message}))
+                    await self.send(text_data=codec.dumps({"error": error_message}))
             elif message_type == "quiz_creation_completed":
                 # Extract required fields
                 recording_id = data.get("recording_id")
@@ -784,32 +898,32 @@ class RecordingConsumer(AsyncWebsocketConsumer):
                         "Invalid data: recording_id and quiz_creation_status are required."
                     )
                     logger.error(error_message)
-                    await self.send(text_data=json.dumps({"error": error_message}))
+                    await self.send(text_data=codec.dumps({"error": error_message}))
             else:
                 # Handle unknown message types
                 error_message = f"Unknown message type: {message_type}"
                 logger.error(error_message)
-                await self.send(text_data=json.dumps({"error": error_message}))
+                await self.send(text_data=codec.dumps({"error": error_message}))
 
-        except json.JSONDecodeError:
+        except ValueError:
             # Handle JSON parsing errors
             error_message = "Invalid JSON format."
             logger.error(error_message)
-            await self.send(text_data=json.dumps({"error": error_message}))
+            await self.send(text_data=codec.dumps({"error": error_message}))
 
         except Exception as e:
             # Log any other exceptions
             logger.exception("An error occurred in receive method.")
-            await self.send(text_data=json.dumps({"error": str(e)}))
+            await self.send(text_data=codec.dumps({"error": str(e)}))
 
     async def transcript_completed_event(self, event):
         # Send the transcript_completed event to WebSocket clients (i.e. this will be sent to the front-end)
         message = event["message"]
         logger.info(f"Broadcasting transcript_completed event: {message}")
-        await self.send(text_data=json.dumps(message))
+        await self.send(text_data=codec.dumps(message))
 
     async def quiz_creation_completed_event(self, event):
         # Send the quiz_creation_completed event to WebSocket clients (i.e. this will be sent to the front-end)
         message = event["message"]
         logger.info(f"Broadcasting quiz_creation_completed event: {message}")
-        await self.send(text_data=json.dumps(message))
+        await self.send(text_data=codec.dumps(message))
@@ -0,0 +1,821 @@
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from . import codec
+from .models import (
+    QuestionMultipleChoice,
+    QuizSession,
+    QuizSessionQuestion,
+    QuizSessionStudent,
+    UserResponse,
+)
+from .serializers import QuizSerializer
+from .services import unscore_question, write_user_responses
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of LiveSession.preload_bundle_json changes.
+PRELOAD_BUNDLE_VERSION = 1
+
+
+class InMemoryStateStore:
+    """
+    Process-local store implementing the subset of the Redis commands used by LiveSession.
+    Meant for tests and single-process development, like channels' InMemoryChannelLayer.
+    """
+
+    def __init__(self, **kwargs):
+        self._data = {}
+        self._mutex = threading.RLock()
+        self._locks = defaultdict(threading.RLock)
+
+    def _container(self, key, factory):
+        return self._data.setdefault(key, factory())
+
+    def exists(self, key) -> bool:
+        return key in self._data
+
+    def delete(self, *keys):
+        with self._mutex:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value):
+        with self._mutex:
+            self._data[key] = str(value)
+
+    def hget(self, key, field):
+        return self._data.get(key, {}).get(str(field))
+
+    def hgetall(self, key) -> dict:
+        return dict(self._data.get(key, {}))
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._mutex:
+            container = self._container(key, dict)
+            if field is not None:
+                container[str(field)] = str(value)
+            for k, v in (mapping or {}).items():
+                container[str(k)] = str(v)
+
+    def hdel(self, key, *fields):
+        with self._mutex:
+            container = self._data.get(key, {})
+            for field in fields:
+                container.pop(str(field), None)
+
+    def hlen(self, key) -> int:
+        return len(self._data.get(key, {}))
+
+    def hincrby(self, key, field, amount=1) -> int:
+        with self._mutex:
+            container = self._container(key, dict)
+            value = int(container.get(str(field), 0)) + amount
+            container[str(field)] = str(value)
+            return value
+
+    def hswap(self, key, field, value=None):
+        """Set (or with ``value=None`` delete) a hash field and return its previous value."""
+        with self._mutex:
+            container = self._container(key, dict)
+            if value is None:
+                return container.pop(str(field), None)
+            previous = container.get(str(field))
+            container[str(field)] = str(value)
+            return previous
+
+    def rpush(self, key, *values) -> int:
+        with self._mutex:
+            container = self._container(key, list)
+            container.extend(str(v) for v in values)
+            return len(container)
+
+    def lpush(self, key, *values) -> int:
+        with self._mutex:
+            container = self._container(key, list)
+            for value in values:
+                container.insert(0, str(value))
+            return len(container)
+
+    def lpop(self, key, count=None):
+        with self._mutex:
+            container = self._data.get(key, [])
+            if count is None:
+                return container.pop(0) if container else None
+            popped = container[:count]
+            del container[:count]
+            return popped or None
+
+    def llen(self, key) -> int:
+        return len(self._data.get(key, []))
+
+    def lock(self, name, timeout=None):
+        return self._locks[name]
+
+    def flush(self):
+        with self._mutex:
+            self._data.clear()
+
+
+class RedisStateStore:
+    """Shares live session state between every Daphne worker through Redis."""
+
+    HSWAP_SCRIPT = """
+        local previous = redis.call('HGET', KEYS[1], ARGV[1])
+        if ARGV[2] == '1' then
+            redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+        else
+            redis.call('HDEL', KEYS[1], ARGV[1])
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return previous
+    """
+
+    def __init__(self, host="localhost", port=6379, db=0, ttl=60 * 60 * 12, **kwargs):
+        import redis
+
+        self.ttl = ttl
+        self.client = redis.Redis(host=host, port=port, db=db, decode_responses=True, **kwargs)
+        self._hswap = self.client.register_script(self.HSWAP_SCRIPT)
+
+    def _write(self, key, command, *args, **kwargs):
+        pipe = self.client.pipeline()
+        getattr(pipe, command)(key, *args, **kwargs)
+        pipe.expire(key, self.ttl)
+        return pipe.execute()[0]
+
+    def exists(self, key) -> bool:
+        return bool(self.client.exists(key))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl)
+
+    def hget(self, key, field):
+        return self.client.hget(key, str(field))
+
+    def hgetall(self, key) -> dict:
+        return self.client.hgetall(key)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        if field is not None:
+            field = str(field)
+        if mapping is not None:
+            mapping = {str(k): v for k, v in mapping.items()}
+        return self._write(key, "hset", field, value, mapping=mapping)
+
+    def hdel(self, key, *fields):
+        return self.client.hdel(key, *[str(f) for f in fields])
+
+    def hlen(self, key) -> int:
+        return self.client.hlen(key)
+
+    def hincrby(self, key, field, amount=1) -> int:
+        return self._write(key, "hincrby", str(field), amount)
+
+    def hswap(self, key, field, value=None):
+        """Set (or with ``value=None`` delete) a hash field and return its previous value."""
+        args = (
+            [str(field), "0", "", self.ttl] if value is None else [str(field), "1", value, self.ttl]
+        )
+        return self._hswap(keys=[key], args=args)
+
+    def rpush(self, key, *values) -> int:
+        return self._write(key, "rpush", *values)
+
+    def lpush(self, key, *values) -> int:
+        return self._write(key, "lpush", *values)
+
+    def lpop(self, key, count=None):
+        return self.client.lpop(key, count)
+
+    def llen(self, key) -> int:
+        return self.client.llen(key)
+
+    def lock(self, name, timeout=10):
+        return self.client.lock(name, timeout=timeout)
+
+
+_store = None
+
+
+def get_state_store():
+    global _store
+    if _store is None:
+        config = getattr(
+            settings,
+            "LIVE_SESSION_STORE",
+            {"BACKEND": "api.live_session.InMemoryStateStore"},
+        )
+        _store = import_string(config["BACKEND"])(**config.get("CONFIG", {}))
+    return _store
+
+
+def _encode_datetime(value):
+    return value.isoformat() if value else ""
+
+
+def _decode_datetime(value):
+    return parse_datetime(value) if value else None
+
+
+class LiveSession:
+    """
+    Live state of a running quiz session, shared by every consumer of the session code.
+
+    Questions and quiz details never change while a session runs, so each process keeps
+    them after the first load. Everything that does change (current question, question queue,
+    timings, colors, roster, answer tallies) lives in the shared state store so every
+    worker sees one quiz. Mutations are written through to the database, which stays
+    authoritative.
+    """
+
+    KEYS = (
+        "meta",
+        "questions",
+        "student_questions",
+        "quiz",
+        "queue",
+        "timings",
+        "colors",
+        "students",
+        "responses",
+        "answers",
+        "tallies",
+        "channels",
+    )
+
+    def __init__(self, code, store):
+        self.code = code
+        self.store = store
+        self.lock = store.lock(self.key("lock"))
+
+        meta = store.hgetall(self.key("meta"))
+        self.session_id = int(meta["session_id"])
+        self.quiz_id = int(meta["quiz_id"]) if meta["quiz_id"] else None
+        self.start_time = _decode_datetime(meta["start_time"])
+        self.live_bar_chart = meta["live_bar_chart"] == "1"
+
+        questions = {
+            int(qid): codec.loads(payload)
+            for qid, payload in store.hgetall(self.key("questions")).items()
+        }
+        self.question_order: List[int] = sorted(questions)
+        self.questions: Dict[int, dict] = questions
+        # Answers are tracked by their index in the question's choices rather than as text.
+        self.choices: Dict[int, List[str]] = {
+            qid: QuestionMultipleChoice.choices_of(
+                question["correct_answer"], question["incorrect_answer_list"]
+            )
+            for qid, question in questions.items()
+        }
+        # Student payloads are kept JSON encoded so broadcasts can splice them into frames.
+        self.student_questions: Dict[int, str] = {
+            int(qid): payload
+            for qid, payload in store.hgetall(self.key("student_questions")).items()
+        }
+        self._preload_bundle: Optional[str] = None
+        self.quiz_json = codec.loads(store.get(self.key("quiz")) or "null")
+
+    def key(self, name) -> str:
+        return f"live_session:{self.code}:{name}"
+
+    @classmethod
+    def populate(cls, code, store):
+        """Copy the session's rows from the database into the state store."""
+        session = QuizSession.objects.select_related("quiz").get(code=code)
+
+        questions = QuestionMultipleChoice.objects.filter(quiz_id=session.quiz_id).select_related(
+            "quiz"
+        )
+        timings = QuizSessionQuestion.objects.filter(quiz_session_id=session.id).values(
+            "question_id", "opened_at", "extension", "unlocked", "skipped"
+        )
+        students = QuizSessionStudent.objects.filter(quiz_session_id=session.id).values_list(
+            "id", "username"
+        )
+        choices = {q.id: q.answer_choices() for q in questions}
+        # Answers to questions outside the session's quiz have no place in the tallies.
+        answers = {
+            f"{question_id}:{student_id}": (
+                choices[question_id].index(selected_answer)
+                if selected_answer in choices[question_id]
+                else QuestionMultipleChoice.NOT_A_CHOICE
+            )
+            for student_id, question_id, selected_answer in UserResponse.objects.filter(
+                quiz_session_id=session.id
+            )
+            .order_by("id")
+            .values_list("student_id", "question_id", "selected_answer")
+            if question_id in choices
+        }
+
+        quiz_json = None
+        if session.quiz is not None:
+            quiz_json = QuizSerializer(session.quiz).data
+            quiz_json["instructor_recording"] = str(quiz_json["instructor_recording"])
+
+        def key(name):
+            return f"live_session:{code}:{name}"
+
+        store.delete(*[key(name) for name in cls.KEYS])
+        store.set(key("quiz"), codec.dumps(quiz_json))
+        if questions:
+            store.hset(
+                key("questions"), mapping={q.id: codec.dumps(q.to_json()) for q in questions}
+            )
+            store.hset(
+                key("student_questions"),
+                mapping={q.id: codec.dumps(q.to_student_json()) for q in questions},
+            )
+        # Questions are served in id order; the queue holds the ones not served yet.
+        served = {row["question_id"] for row in timings}
+        queue = sorted(q.id for q in questions if q.id not in served)
+        if queue:
+            store.rpush(key("queue"), *queue)
+        if timings:
+            store.hset(
+                key("timings"),
+                mapping={row["question_id"]: cls._encode_timing(row) for row in timings},
+            )
+        if session.question_colors:
+            store.hset(
+                key("colors"),
+                mapping={qid: codec.dumps(order) for qid, order in session.question_colors.items()},
+            )
+        if students:
+            store.hset(key("students"), mapping=dict(students))
+        if answers:
+            store.hset(key("answers"), mapping=answers)
+            tallies = Counter(
+                f"{field.split(':', 1)[0]}:{choice}" for field, choice in answers.items()
+            )
+            store.hset(key("tallies"), mapping=tallies)
+        # meta is written last; its presence marks the state as loaded.
+        store.hset(
+            key("meta"),
+            mapping={
+                "session_id": session.id,
+                "quiz_id": session.quiz_id or "",
+                "start_time": _encode_datetime(session.start_time),
+                "live_bar_chart": int(session.quiz is None or session.quiz.live_bar_chart),
+                "end_time": _encode_datetime(session.end_time),
+                "current_question": session.current_question_id or "",
+            },
+        )
+
+    @staticmethod
+    def _encode_timing(timing) -> str:
+        return codec.dumps(
+            {
+                "opened_at": _encode_datetime(timing["opened_at"]),
+                "extension": timing["extension"],
+                "unlocked": timing["unlocked"],
+                "skipped": timing["skipped"],
+            }
+        )
+
+    @property
+    def end_time(self):
+        return _decode_datetime(self.store.hget(self.key("meta"), "end_time"))
+
+    @property
+    def current_question_id(self) -> Optional[int]:
+        value = self.store.hget(self.key("meta"), "current_question")
+        return int(value) if value else None
+
+    @property
+    def question_colors(self) -> dict:
+        return {
+            qid: codec.loads(order) for qid, order in self.store.hgetall(self.key("colors")).items()
+        }
+
+    def to_json(self):
+        meta = self.store.hgetall(self.key("meta"))
+        return {
+            "code": self.code,
+            "start_time": meta["start_time"] or None,
+            "end_time": meta["end_time"] or None,
+            "quiz_id": self.quiz_id,
+            "question_colors": self.question_colors,
+            "current_question": int(meta["current_question"]) if meta["current_question"] else None,
+        }
+
+    def current_question(self) -> Optional[dict]:
+        current_question_id = self.current_question_id
+        if current_question_id is None:
+            return None
+        return self.questions.get(current_question_id)
+
+    def question(self, question_id) -> Optional[dict]:
+        return self.questions.get(int(question_id))
+
+    def student_question_json(self, question_id) -> Optional[str]:
+        """The JSON encoded question as students see it, without the answer key."""
+        return self.student_questions.get(int(question_id))
+
+    def student_question(self, question_id) -> Optional[dict]:
+        payload = self.student_question_json(question_id)
+        return codec.loads(payload) if payload is not None else None
+
+    def preload_bundle_json(self) -> str:
+        """Every question of the session, JSON encoded, for clients that preload the quiz."""
+        if self._preload_bundle is None:
+            questions = ", ".join(self.student_questions[qid] for qid in self.question_order)
+            self._preload_bundle = (
+                f'{{"version": {PRELOAD_BUNDLE_VERSION}, "code": {codec.dumps(self.code)}, '
+                f'"questions": [{questions}]}}'
+            )
+        return self._preload_bundle
+
+    def advance(self) -> Optional[dict]:
+        """Serve the next question of the session, or return None once the queue is empty."""
+        # LPOP is atomic, so when two workers advance at once each gets a different question.
+        next_id = self.store.lpop(self.key("queue"))
+        if next_id is None:
+            return None
+        next_id = int(next_id)
+
+        try:
+            with transaction.atomic():
+                row = QuizSessionQuestion.objects.create(
+                    quiz_session_id=self.session_id, question_id=next_id
+                )
+                QuizSession.objects.filter(id=self.session_id).update(current_question_id=next_id)
+        except Exception:
+            self.store.lpush(self.key("queue"), next_id)
+            raise
+
+        self.store.hset(
+            self.key("timings"),
+            next_id,
+            self._encode_timing(
+                {
+                    "opened_at": row.opened_at,
+                    "extension": row.extension,
+                    "unlocked": row.unlocked,
+                    "skipped": row.skipped,
+                }
+            ),
+        )
+        self.store.hset(self.key("meta"), "current_question", next_id)
+        return self.questions[next_id]
+
+    def timing(self, question_id) -> Optional[dict]:
+        value = self.store.hget(self.key("timings"), int(question_id))
+        if value is None:
+            return None
+        timing = codec.loads(value)
+        timing["opened_at"] = _decode_datetime(timing["opened_at"])
+        return timing
+
+    def _update_timing(self, question_id, db_changes, apply):
+        with self.lock:
+            timing = self.timing(question_id)
+            if timing is None:
+                raise QuizSessionQuestion.DoesNotExist(
+                    f"Question {question_id} has not been served in session {self.code}"
+                )
+            QuizSessionQuestion.objects.filter(
+                quiz_session_id=self.session_id, question_id=question_id
+            ).update(**db_changes)
+            apply(timing)
+            self.store.hset(self.key("timings"), int(question_id), self._encode_timing(timing))
+            return timing
+
+    def open_question(self, question_id):
+        opened_at = timezone.now()
+        return self._update_timing(
+            question_id,
+            {"opened_at": opened_at},
+            lambda timing: timing.update(opened_at=opened_at),
+        )
+
+    def extend_question(self, question_id, extension: int):
+        return self._update_timing(
+            question_id,
+            {"extension": F("extension") + extension},
+            lambda timing: timing.update(extension=timing["extension"] + extension),
+        )
+
+    def skip_question(self, question_id):
+        """
+        Skip a served question and take its correct answers back out of the running scores.
+        Holding the flush lock means its buffered answers are either already written (and
+        unscored here) or written afterwards, when they no longer count.
+        """
+        changes = {"skipped": True, "unlocked": False}
+        with self.store.lock(self.key("flush"), timeout=60), transaction.atomic():
+            already_skipped = (self.timing(question_id) or {}).get("skipped")
+            timing = self._update_timing(
+                question_id, changes, lambda timing: timing.update(changes)
+            )
+            if not already_skipped:
+                unscore_question(self.session_id, question_id)
+            return timing
+
+    def is_question_open(self, question_id) -> bool:
+        question = self.question(question_id)
+        timing = self.timing(question_id) if question is not None else None
+        if timing is None:
+            logger.warning(
+                f"Attempt to check if non existant question is open. "
+                f"question_id={question_id} session_code={self.code}"
+            )
+            return False
+
+        if timing["unlocked"] is False:
+            return False
+        adjusted_open_time = timing["opened_at"].timestamp() + timing["extension"]
+        return timezone.now().timestamp() - adjusted_open_time <= question["duration"]
+
+    def choice_index(self, question_id, selected_answer) -> int:
+        choices = self.choices.get(int(question_id), [])
+        if selected_answer in choices:
+            return choices.index(selected_answer)
+        return QuestionMultipleChoice.NOT_A_CHOICE
+
+    def choice_text(self, question_id, choice) -> Optional[str]:
+        """The answer at index ``choice`` of the question's choices, or None if out of range."""
+        choices = self.choices.get(int(question_id), [])
+        if isinstance(choice, int) and 0 <= choice < len(choices):
+            return choices[choice]
+        return None
+
+    def record_answer(self, student_id, question_id, selected_answer):
+        """Count an answer in the question's tally, replacing the student's previous answer."""
+        question_id = int(question_id)
+        choice = str(self.choice_index(question_id, selected_answer))
+        previous = self.store.hswap(self.key("answers"), f"{question_id}:{int(student_id)}", choice)
+        if previous == choice:
+            return
+        if previous is not None:
+            self.store.hincrby(self.key("tallies"), f"{question_id}:{previous}", -1)
+        self.store.hincrby(self.key("tallies"), f"{question_id}:{choice}", 1)
+
+    def tally(self, question_id) -> dict:
+        """
+        The question's answer counts by answer text. Answers that are not among the choices
+        count towards total_responses only.
+        """
+        prefix = f"{int(question_id)}:"
+        counts = {
+            int(field[len(prefix) :]): int(count)
+            for field, count in self.store.hgetall(self.key("tallies")).items()
+            if field.startswith(prefix) and int(count) > 0
+        }
+        answers = {
+            self.choices[int(question_id)][choice]: count
+            for choice, count in counts.items()
+            if choice != QuestionMultipleChoice.NOT_A_CHOICE
+        }
+        return {"total_responses": sum(counts.values()), "answers": answers}
+
+    def buffer_response(self, student_id, question_id, selected_answer, is_correct) -> int:
+        """
+        Count an answer and queue it for the next flush; returns the number of queued
+        answers.
+        """
+        self.record_answer(student_id, question_id, selected_answer)
+        return self.store.rpush(
+            self.key("responses"),
+            codec.dumps(
+                {
+                    "student_id": int(student_id),
+                    "question_id": int(question_id),
+                    "selected_answer": selected_answer,
+                    "is_correct": is_correct,
+                }
+            ),
+        )
+
+    def pending_responses(self) -> int:
+        return self.store.llen(self.key("responses"))
+
+    def flush_responses(self, batch_size=500) -> Set[int]:
+        """
+        Write every queued answer to the database and return the ids of the questions
+        that received answers. Holding the flush lock while writing means a flush that
+        finds the queue empty has also waited for any flush still in flight elsewhere.
+        """
+        with self.store.lock(self.key("flush"), timeout=60):
+            return self._write_queued_responses(batch_size)
+
+    def _write_queued_responses(self, batch_size) -> Set[int]:
+        question_ids = set()
+        while True:
+            batch = self.store.lpop(self.key("responses"), batch_size)
+            if not batch:
+                return question_ids
+            try:
+                question_ids |= write_user_responses(
+                    self.session_id, [codec.loads(entry) for entry in batch]
+                )
+            except Exception:
+                # Put the batch back in front of the queue so no answer is lost.
+                self.store.lpush(self.key("responses"), *reversed(batch))
+                raise
+
+    def discard(self, batch_size=500):
+        """
+        Drop the session's shared state. Answers queued since the last flush were already
+        acknowledged to students, so they are written first, under the same flush lock.
+        """
+        with self.store.lock(self.key("flush"), timeout=60):
+            self._write_queued_responses(batch_size)
+            self.store.delete(*[self.key(name) for name in self.KEYS])
+
+    def set_question_colors(self, question_id, order):
+        self.store.hset(self.key("colors"), question_id, codec.dumps(order))
+        # The database copy outlives the store; merge into it under a row lock so workers
+        # storing the colors of different questions at once keep each other's.
+        with transaction.atomic():
+            session = (
+                QuizSession.objects.select_for_update()
+                .only("question_colors")
+                .filter(id=self.session_id)
+                .first()
+            )
+            if session is not None:
+                session.question_colors = {
+                    **(session.question_colors or {}),
+                    str(question_id): order,
+                }
+                session.save(update_fields=["question_colors"])
+
+    @property
+    def user_count(self) -> int:
+        return self.store.hlen(self.key("students"))
+
+    def add_student(self, username) -> QuizSessionStudent:
+        student = QuizSessionStudent.objects.create(
+            username=username, quiz_session_id=self.session_id
+        )
+        self.track_student(student)
+        return student
+
+    def track_student(self, student: QuizSessionStudent):
+        self.store.hset(self.key("students"), student.id, student.username)
+
+    def has_student(self, student_id) -> bool:
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            return False
+        if self.store.hget(self.key("students"), student_id) is not None:
+            return True
+
+        # Students may join through the REST API of another request; read through once.
+        student = QuizSessionStudent.objects.filter(
+            id=student_id, quiz_session_id=self.session_id
+        ).first()
+        if student is None:
+            return False
+        self.track_student(student)
+        return True
+
+    def connect_student(self, student_id, channel_name):
+        """Remember the websocket channel the student is reachable on, for pushes like grades."""
+        self.store.hset(self.key("channels"), int(student_id), channel_name)
+
+    def student_channels(self) -> Dict[int, str]:
+        return {
+            int(student_id): channel_name
+            for student_id, channel_name in self.store.hgetall(self.key("channels")).items()
+        }
+
+    def remove_student(self, student_id):
+        QuizSessionStudent.objects.get(quiz_session_id=self.session_id, id=student_id).delete()
+        self.store.hdel(self.key("students"), student_id)
+        self.store.hdel(self.key("channels"), student_id)
+        # The student's responses are deleted with them, so take their answers out of the tallies.
+        for question_id in self.question_order:
+            previous = self.store.hswap(self.key("answers"), f"{question_id}:{int(student_id)}")
+            if previous is not None:
+                self.store.hincrby(self.key("tallies"), f"{question_id}:{previous}", -1)
+
+    def end(self):
+        end_time = timezone.now()
+        QuizSession.objects.filter(id=self.session_id).update(end_time=end_time)
+        self.store.hset(self.key("meta"), "end_time", _encode_datetime(end_time))
+
+
+_live_sessions: Dict[str, LiveSession] = {}
+_live_sessions_lock = threading.Lock()
+
+
+def _meta_key(code) -> str:
+    return f"live_session:{code}:meta"
+
+
+def _is_current(live_session, store) -> bool:
+    # A recycled code or an invalidation by another worker replaces the stored session.
+    stored_id = store.hget(_meta_key(live_session.code), "session_id")
+    return stored_id == str(live_session.session_id)
+
+
+def _cached_live_session(code, store) -> Optional[LiveSession]:
+    """This process's handle on ``code``, dropped once it no longer matches the store."""
+    live_session = _live_sessions.get(code)
+    if live_session is None or _is_current(live_session, store):
+        return live_session
+    with _live_sessions_lock:
+        if _live_sessions.get(code) is live_session:
+            del _live_sessions[code]
+    return None
+
+
+def _open_live_session(code, store, load) -> Optional[LiveSession]:
+    with _live_sessions_lock:
+        with store.lock(f"live_session:{code}:load"):
+            if not store.exists(_meta_key(code)):
+                if not load:
+                    return None
+                LiveSession.populate(code, store)
+            live_session = LiveSession(code, store)
+        # Handles whose session was invalidated elsewhere are otherwise only dropped when
+        # this process asks for their code again; sweep them while a new one is added.
+        for stale in [other for other in _live_sessions.values() if not _is_current(other, store)]:
+            del _live_sessions[stale.code]
+        _live_sessions[code] = live_session
+        return live_session
+
+
+def get_live_session(code) -> LiveSession:
+    """
+    Return the live state for ``code``, loading it into the state store on first use.
+    Raises QuizSession.DoesNotExist for unknown codes.
+    """
+    store = get_state_store()
+    return _cached_live_session(code, store) or _open_live_session(code, store, load=True)
+
+
+def get_live_session_or_404(code) -> LiveSession:
+    try:
+        return get_live_session(code)
+    except QuizSession.DoesNotExist:
+        raise Http404("No QuizSession matches the given query.")
+
+
+def get_running_live_session_or_404(code) -> LiveSession:
+    """
+    Like get_live_session_or_404, for callers that anyone can reach with a guessed code: only
+    a session that has started and not ended is loaded into the state store.
+    """
+    live_session = peek_live_session(code)
+    if live_session is None:
+        running = QuizSession.objects.filter(
+            code=code, start_time__lte=timezone.now(), end_time__isnull=True
+        )
+        if not running.exists():
+            raise Http404("No running QuizSession matches the given query.")
+        live_session = get_live_session_or_404(code)
+    if live_session.end_time is not None:
+        raise Http404("No running QuizSession matches the given query.")
+    return live_session
+
+
+def peek_live_session(code) -> Optional[LiveSession]:
+    """Return the live state for ``code`` only if some worker has already loaded it."""
+    store = get_state_store()
+    live_session = _cached_live_session(code, store)
+    if live_session is None and store.exists(_meta_key(code)):
+        live_session = _open_live_session(code, store, load=False)
+    return live_session
+
+
+def invalidate_live_session(code):
+    with _live_sessions_lock:
+        _live_sessions.pop(code, None)
+        store = get_state_store()
+        if store.exists(_meta_key(code)):
+            LiveSession(code, store).discard()
+        else:
+            store.delete(*[f"live_session:{code}:{name}" for name in LiveSession.KEYS])
+
+
+def clear_live_sessions():
+    with _live_sessions_lock:
+        _live_sessions.clear()
+        store = get_state_store()
+        if hasattr(store, "flush"):
+            store.flush()
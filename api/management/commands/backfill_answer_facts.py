@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api.models import QuizSession, UserResponse
+from api.services import write_answer_facts
+
+
+class Command(BaseCommand):
+    help = "Write the answer facts of every session answered before they were recorded"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Rewrite existing answer facts as well"
+        )
+
+    def handle(self, *args, **options):
+        sessions = QuizSession.objects.filter(responses__isnull=False).distinct().order_by("id")
+        if not options["all"]:
+            sessions = sessions.filter(answer_facts__isnull=True)
+
+        count = 0
+        for session_id in sessions.values_list("id", flat=True).iterator():
+            write_answer_facts(
+                session_id,
+                UserResponse.objects.filter(quiz_session_id=session_id).only(
+                    "student_id", "question_id", "selected_answer", "is_correct"
+                ),
+            )
+            count += 1
+            if count % 500 == 0:
+                self.stdout.write(f"{count} sessions backfilled...")
+        self.stdout.write(f"{count} sessions backfilled")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.models import QuizSession
+from api.services import summarize_session
+
+
+class Command(BaseCommand):
+    help = "Write the summary of every finished session that does not have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rewrite existing summaries as well")
+
+    def handle(self, *args, **options):
+        sessions = QuizSession.objects.filter(end_time__isnull=False).order_by("id")
+        if not options["all"]:
+            sessions = sessions.filter(summary__isnull=True)
+
+        count = 0
+        for session_id in sessions.values_list("id", flat=True).iterator():
+            summarize_session(session_id)
+            count += 1
+            if count % 500 == 0:
+                self.stdout.write(f"{count} sessions summarized...")
+        self.stdout.write(f"{count} session summaries written")
@@ -0,0 +1,93 @@
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api import codec
+from api.consumers import StudentConsumer, broadcast
+
+GROUP = "benchmark_broadcast"
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class _Recipient(StudentConsumer):
+    """A student consumer whose frames are dropped instead of written to a socket."""
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        pass
+
+
+class _EncodingRecipient(_Recipient):
+    """The previous handler: every recipient encodes the event it receives."""
+
+    async def next_question(self, event):
+        await self.send(text_data=codec.dumps(event))
+
+
+class Command(BaseCommand):
+    help = "Time a broadcast through an in-memory channel layer, encoded per recipient or once"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=500)
+        parser.add_argument("--rounds", type=int, default=200)
+
+    def handle(self, *args, **options):
+        students = options["students"]
+        rounds = options["rounds"]
+        fields = {
+            "question": {
+                "id": 1024,
+                "question_text": "Which planet in the solar system has the most moons?",
+                "choices": ["Jupiter", "Mars", "Neptune", "Saturn"],
+                "points": 1,
+                "quiz_id": 87,
+                "duration": 20,
+            },
+            "quiz_session": {
+                "code": "AB12C",
+                "start_time": "2024-10-01T14:00:00+00:00",
+                "end_time": None,
+                "quiz_id": 87,
+                "question_colors": {"1023": ["Red", "Blue", "Green", "Yellow"]},
+                "current_question": 1024,
+            },
+            "order": ["Saturn", "Jupiter", "Neptune", "Mars"],
+        }
+
+        async def send_raw():
+            await get_channel_layer().group_send(GROUP, {"type": "next_question", **fields})
+
+        async def send_encoded():
+            await broadcast(GROUP, "next_question", **fields)
+
+        async def run(recipient_class, send):
+            layer = get_channel_layer()
+            recipients = []
+            for _ in range(students):
+                recipient = recipient_class()
+                recipient.channel_name = await layer.new_channel()
+                await layer.group_add(GROUP, recipient.channel_name)
+                recipients.append(recipient)
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await send()
+                for recipient in recipients:
+                    await recipient.dispatch(await layer.receive(recipient.channel_name))
+            elapsed = (time.perf_counter() - start) / rounds
+
+            await layer.flush()
+            return elapsed
+
+        # The sender and every recipient share one process, so the timings include the
+        # layer's own copying of each message but no network or Redis round trips.
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+            per_recipient = async_to_sync(run)(_EncodingRecipient, send_raw)
+            once = async_to_sync(run)(_Recipient, send_encoded)
+
+        self.stdout.write(f"{students} recipients, {rounds} broadcasts")
+        self.stdout.write(f"encode per recipient: {per_recipient * 1000:.3f} ms per broadcast")
+        self.stdout.write(f"encode once:          {once * 1000:.3f} ms per broadcast")
+        self.stdout.write(f"speedup:              {per_recipient / once:.1f}x")
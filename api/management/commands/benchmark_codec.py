@@ -0,0 +1,99 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from api import codec
+
+
+def _payloads(students):
+    now = datetime.now(timezone.utc)
+    question = {
+        "id": 1024,
+        "question_text": "Which planet in the solar system has the most moons?",
+        "choices": ["Jupiter", "Mars", "Neptune", "Saturn"],
+        "points": 1,
+        "quiz_id": 87,
+        "duration": 20,
+    }
+    return {
+        "quiz_details": {
+            "type": "quiz_details",
+            "quiz": {
+                "id": 87,
+                "title": "Astronomy week 3",
+                "start_time": now.isoformat(),
+                "end_time": None,
+                "timer": True,
+                "instructor_recording": "5f0c1f7e-2b1d-4d3c-9a51-2a7a7c2e6d10",
+                "created_at": now.isoformat(),
+                "num_questions": 10,
+                "num_sessions": 3,
+            },
+            "user_count": students,
+        },
+        "next_question": {
+            "type": "next_question",
+            "question": question,
+            "quiz_session": {
+                "code": "AB12C",
+                "start_time": now.isoformat(),
+                "end_time": None,
+                "quiz_id": 87,
+                "question_colors": {"1023": ["Red", "Blue", "Green", "Yellow"]},
+                "current_question": 1024,
+            },
+            "order": ["Saturn", "Jupiter", "Neptune", "Mars"],
+        },
+        "update_answers": {
+            "type": "update_answers",
+            "question_id": 1024,
+            "new_responses": 37,
+            "data": {
+                "total_responses": students,
+                "answers": {"Jupiter": 120, "Mars": 31, "Neptune": 49, "Saturn": students - 200},
+            },
+        },
+        "grade_buckets": {
+            "type": "quiz_ended",
+            "grades": {
+                round(score * 10.0, 2): [f"student_{i}" for i in range(score, students, 11)]
+                for score in range(11)
+            },
+        },
+    }
+
+
+def _time(function, payload, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function(payload)
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+class Command(BaseCommand):
+    help = "Compare stdlib json with the api.codec backend on the websocket payload shapes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=500)
+        parser.add_argument("--rounds", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        backend = "orjson" if codec.orjson is not None else "stdlib json"
+        self.stdout.write(f"codec backend: {backend}, {rounds} rounds, times in µs per call")
+        self.stdout.write(
+            f"{'payload':<16}{'json.dumps':>12}{'codec.dumps':>13}{'json.loads':>12}"
+            f"{'codec.loads':>13}"
+        )
+
+        for name, payload in _payloads(options["students"]).items():
+            encoded = json.dumps(payload)
+            self.stdout.write(
+                f"{name:<16}"
+                f"{_time(json.dumps, payload, rounds):>12.2f}"
+                f"{_time(codec.dumps, payload, rounds):>13.2f}"
+                f"{_time(json.loads, encoded, rounds):>12.2f}"
+                f"{_time(codec.loads, encoded, rounds):>13.2f}"
+            )
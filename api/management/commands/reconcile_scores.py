@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from api.models import QuizSessionQuestion, QuizSessionStudent
+from api.services import expected_scores, score_session
+
+
+class Command(BaseCommand):
+    help = "Recompute session scores from the stored answers and report where the running scores drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", type=int, action="append", dest="sessions")
+        parser.add_argument(
+            "--fix", action="store_true", help="Rewrite the scores of sessions that drifted"
+        )
+
+    def handle(self, *args, **options):
+        sessions = (
+            QuizSessionQuestion.objects.filter(skipped=False)
+            .order_by("quiz_session_id")
+            .values_list("quiz_session_id", flat=True)
+            .distinct()
+        )
+        if options["sessions"]:
+            sessions = sessions.filter(quiz_session_id__in=options["sessions"])
+
+        drifted_sessions = 0
+        for session_id in sessions:
+            expected = expected_scores(session_id)
+            # An ungraded student (score -1) without correct answers has not drifted.
+            stored = QuizSessionStudent.objects.filter(quiz_session_id=session_id)
+            drift = {
+                student_id: (score, expected[student_id])
+                for student_id, score in stored.values_list("id", "score")
+                if max(score, 0) != expected[student_id]
+            }
+            if not drift:
+                continue
+
+            drifted_sessions += 1
+            self.stdout.write(f"session {session_id}: {len(drift)} student(s) drifted")
+            for student_id, (score, correct) in sorted(drift.items()):
+                self.stdout.write(f"  student {student_id}: stored {score}, expected {correct}")
+            if options["fix"]:
+                score_session(session_id)
+                self.stdout.write(f"  session {session_id} rescored")
+
+        self.stdout.write(f"{drifted_sessions} session(s) with drifted scores")
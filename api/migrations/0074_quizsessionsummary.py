@@ -0,0 +1,38 @@
+# Generated by Django 4.2.6 on 2026-10-17 02:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0073_quizsessionquestion_skipped_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuizSessionSummary",
+            fields=[
+                (
+                    "quiz_session",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="api.quizsession",
+                    ),
+                ),
+                ("participant_count", models.IntegerField(default=0)),
+                ("response_count", models.IntegerField(default=0)),
+                ("mean_score", models.FloatField(blank=True, null=True)),
+                ("question_count", models.IntegerField(default=0)),
+                ("skipped_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "api_quiz_session_summary",
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.6 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0074_quizsessionsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="quizsessionlog",
+            index=models.Index(
+                fields=["quiz_session", "-created_at"], name="session_log_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="quizsessionquestion",
+            index=models.Index(
+                fields=["quiz_session", "skipped", "question"], name="session_question_skipped_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="quizsessionstudent",
+            index=models.Index(fields=["quiz_session", "score"], name="session_student_score_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="userresponse",
+            index=models.Index(
+                fields=["quiz_session", "question"], name="response_session_question_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userresponse",
+            index=models.Index(
+                condition=models.Q(("is_correct", True)),
+                fields=["student", "question", "quiz_session"],
+                name="response_correct_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userresponse",
+            index=models.Index(
+                fields=["quiz_session", "student", "id"],
+                include=("question", "selected_answer", "is_correct"),
+                name="response_session_rows_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.6 on 2026-10-17 03:31
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_responses(apps, schema_editor):
+    # Keep the latest answer of a student to a question in a session, as the answer
+    # buffer does when it flushes.
+    UserResponse = apps.get_model("api", "UserResponse")
+    duplicates = (
+        UserResponse.objects.filter(quiz_session__isnull=False)
+        .order_by()
+        .values("quiz_session_id", "question_id", "student_id")
+        .annotate(latest_id=Max("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        UserResponse.objects.filter(
+            quiz_session_id=duplicate["quiz_session_id"],
+            question_id=duplicate["question_id"],
+            student_id=duplicate["student_id"],
+        ).exclude(id=duplicate["latest_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0075_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_responses, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="userresponse",
+            name="response_session_question_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="userresponse",
+            constraint=models.UniqueConstraint(
+                fields=("quiz_session", "question", "student"), name="unique_user_response"
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.6 on 2026-10-17 03:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_choice_history(apps, schema_editor):
+    # Existing questions start their history with their choices in the order they are shown.
+    QuestionMultipleChoice = apps.get_model("api", "QuestionMultipleChoice")
+    questions = QuestionMultipleChoice.objects.only("id", "correct_answer", "incorrect_answer_list")
+    for question in questions.iterator():
+        question.choice_history = sorted(
+            [question.correct_answer]
+            + [
+                answer["answer"] if isinstance(answer, dict) else answer
+                for answer in question.incorrect_answer_list
+            ]
+        )
+        question.save(update_fields=["choice_history"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0076_unique_user_response"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="questionmultiplechoice",
+            name="choice_history",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(record_choice_history, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="AnswerFact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("choice", models.SmallIntegerField()),
+                ("is_correct", models.BooleanField(default=False)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answer_facts",
+                        to="api.questionmultiplechoice",
+                    ),
+                ),
+                (
+                    "quiz_session",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answer_facts",
+                        to="api.quizsession",
+                    ),
+                ),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="answer_facts",
+                        to="api.quizsessionstudent",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "api_answer_fact",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="answerfact",
+            constraint=models.UniqueConstraint(
+                fields=("quiz_session", "question", "student"), name="unique_answer_fact"
+            ),
+        ),
+    ]
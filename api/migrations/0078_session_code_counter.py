@@ -0,0 +1,38 @@
+# Generated by Django 4.2.6 on 2026-10-17 05:10
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    apps.get_model("api", "SessionCodeCounter").objects.create(id=1, position=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0077_answerfact"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionCodeCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("position", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "api_session_code_counter",
+            },
+        ),
+        migrations.AlterField(
+            model_name="quizsession",
+            name="code",
+            field=models.CharField(max_length=6, null=True, unique=True),
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,7 @@ import random
 import string
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -65,6 +65,19 @@ class InstructorRecordings(models.Model):
         db_table = "api_instructor_recordings"
 
 
+class QuizQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Annotate num_questions and num_sessions so listing quizzes needs no COUNT per quiz."""
+        quizzes = self.annotate(
+            num_questions=models.Count("questions", distinct=True),
+            num_sessions=models.Count("sessions", distinct=True),
+        )
+        # Meta.ordering is not applied to GROUP BY queries; keep it unless ordered explicitly.
+        if not self.query.order_by:
+            quizzes = quizzes.order_by(*self.model._meta.ordering)
+        return quizzes
+
+
 class Quiz(models.Model):
     title = models.CharField(max_length=200)
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE, null=True)
@@ -81,9 +94,22 @@ class Quiz(models.Model):
         InstructorRecordings, on_delete=models.CASCADE, null=True
     )
 
+    objects = QuizQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
 
+    def count_questions(self) -> int:
+        # Quizzes loaded through Quiz.objects.with_counts() carry the count already.
+        if hasattr(self, "num_questions"):
+            return self.num_questions
+        return self.questions.count()
+
+    def count_sessions(self) -> int:
+        if hasattr(self, "num_sessions"):
+            return self.num_sessions
+        return self.sessions.count()
+
     def to_json(self):
         return {
             "id": self.id,
@@ -95,8 +121,8 @@ class Quiz(models.Model):
             "instructor_recording_id": (
                 self.instructor_recording.id if self.instructor_recording else None
             ),
-            "num_sessions": self.sessions.count(),
-            "num_questions": self.questions.count(),
+            "num_sessions": self.count_sessions(),
+            "num_questions": self.count_questions(),
             # Settings attributes
             "timer": self.timer,
             "live_bar_chart": self.live_bar_chart,
@@ -104,16 +130,56 @@ class Quiz(models.Model):
 
 
 class QuestionMultipleChoice(models.Model):
+    # The choice id of an answer that is not one of the question's choices.
+    NOT_A_CHOICE = -1
+
     question_text = models.TextField(null=True, blank=True)
     incorrect_answer_list = models.JSONField()
     correct_answer = models.CharField(max_length=500)
     points = models.IntegerField(default=1)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="questions")
     duration = models.IntegerField(default=20)
+    # Every choice the question has offered, in order of first appearance. Answers are stored
+    # by their index in this list (their choice id), which editing the choices never changes.
+    choice_history = models.JSONField(default=list, blank=True)
 
     class Meta:
         db_table = "api_question_multiple_choice"
 
+    def save(self, *args, **kwargs):
+        self.choice_history = self._extended_choice_history()
+        super().save(*args, **kwargs)
+
+    def _extended_choice_history(self) -> list:
+        return self.choice_history + [
+            choice for choice in self.answer_choices() if choice not in self.choice_history
+        ]
+
+    @classmethod
+    def record_choice_histories(cls, questions):
+        """
+        Add the current choices missing from the questions' choice_history, in the database
+        and on ``questions``. save() keeps the history up to date, but bulk_create() and
+        QuerySet.update() bypass it; call this before computing choice ids.
+        """
+        stale = [q for q in questions if not set(q.answer_choices()) <= set(q.choice_history)]
+        if not stale:
+            return
+        with transaction.atomic():
+            locked = cls.objects.select_for_update().filter(id__in=[q.id for q in stale])
+            current = {
+                question.id: question
+                for question in locked.only(
+                    "id", "correct_answer", "incorrect_answer_list", "choice_history"
+                )
+            }
+            for question in current.values():
+                question.choice_history = question._extended_choice_history()
+            cls.objects.bulk_update(current.values(), ["choice_history"])
+        for question in stale:
+            if question.id in current:
+                question.choice_history = current[question.id].choice_history
+
     def to_json(self):
         return {
             "id": self.id,
@@ -125,9 +191,47 @@ class QuestionMultipleChoice(models.Model):
             "duration": self.duration,
         }
 
+    @staticmethod
+    def choices_of(correct_answer, incorrect_answer_list) -> list:
+        """
+        Every answer students can pick, in the order they are shown. Sorting keeps the
+        position of the correct answer from giving it away, and students send answers as
+        indexes into this list.
+        """
+        return sorted(
+            [correct_answer]
+            + [
+                answer["answer"] if isinstance(answer, dict) else answer
+                for answer in incorrect_answer_list
+            ]
+        )
+
+    def answer_choices(self) -> list:
+        return self.choices_of(self.correct_answer, self.incorrect_answer_list)
+
+    def choice_index(self, answer) -> int:
+        choices = self.answer_choices()
+        return choices.index(answer) if answer in choices else self.NOT_A_CHOICE
+
+    def choice_id(self, answer) -> int:
+        if answer in self.choice_history:
+            return self.choice_history.index(answer)
+        return self.NOT_A_CHOICE
+
+    def to_student_json(self):
+        return {
+            "id": self.id,
+            "question_text": self.question_text,
+            "choices": self.answer_choices(),
+            "points": self.points,
+            "quiz_id": self.quiz_id,
+            "duration": self.duration,
+        }
+
 
 class QuizSession(models.Model):
-    code = models.CharField(max_length=6, unique=True)
+    # Null once the code has been recycled for a later session; see api.session_codes.
+    code = models.CharField(max_length=6, unique=True, null=True)
     start_time = models.DateTimeField(default=timezone.now)
     end_time = models.DateTimeField(null=True, blank=True)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="sessions", null=True)
@@ -149,25 +253,15 @@ class QuizSession(models.Model):
     )
 
     def generate_unique_code(self):
-        length = 5
-        allowed_characters = "".join(
-            [
-                c
-                for c in string.ascii_uppercase + string.digits
-                if c not in {"I", "o", "O", "l", "0"}
-            ]
-        )
+        from .session_codes import allocate_code
 
-        while True:
-            code = "".join(random.choices(allowed_characters, k=length))
-            if not QuizSession.objects.filter(code=code).exists():
-                return code
+        return allocate_code()
 
     def to_json(self):
         return {
             "code": self.code,
-            "start_time": self.start_time.isoformat() if self.start_time else None,
-            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
             "quiz_id": self.quiz.id if self.quiz else None,
             "question_colors": self.question_colors,
             "current_question": (self.current_question.id if self.current_question else None),
@@ -177,6 +271,15 @@ class QuizSession(models.Model):
         db_table = "api_quiz_session"
 
 
+class SessionCodeCounter(models.Model):
+    """Position of the next session code in its permuted sequence; a single row."""
+
+    position = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "api_session_code_counter"
+
+
 class QuizSessionStudent(models.Model):
     username = models.CharField(max_length=200)
     joined_at = models.DateTimeField(default=timezone.now)
@@ -185,6 +288,10 @@ class QuizSessionStudent(models.Model):
 
     class Meta:
         db_table = "api_quiz_session_student"
+        indexes = [
+            # Grade distribution and session summaries read the scores of one session.
+            models.Index(fields=["quiz_session", "score"], name="session_student_score_idx"),
+        ]
 
 
 class QuizSessionLog(models.Model):
@@ -201,6 +308,9 @@ class QuizSessionLog(models.Model):
     class Meta:
         db_table = "api_quiz_session_log"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["quiz_session", "-created_at"], name="session_log_created_idx"),
+        ]
 
 
 class UserResponse(models.Model):
@@ -218,6 +328,57 @@ class UserResponse(models.Model):
 
     class Meta:
         db_table = "api_user_response"
+        constraints = [
+            # quiz_session and question lead, so this also serves a session's answers to a
+            # question.
+            models.UniqueConstraint(
+                fields=["quiz_session", "question", "student"], name="unique_user_response"
+            ),
+        ]
+        indexes = [
+            # Scoring only counts correct answers; quiz_session is last so the count is
+            # answered from the index alone.
+            models.Index(
+                fields=["student", "question", "quiz_session"],
+                condition=models.Q(is_correct=True),
+                name="response_correct_idx",
+            ),
+            # The results export and the live-session reload read a session's answers in
+            # student order; on PostgreSQL the included columns come from the index too.
+            models.Index(
+                fields=["quiz_session", "student", "id"],
+                include=["question", "selected_answer", "is_correct"],
+                name="response_session_rows_idx",
+            ),
+        ]
+
+
+class AnswerFact(models.Model):
+    """
+    Narrow copy of a UserResponse for aggregates: the answer is stored as its index in the
+    question's choice_history (QuestionMultipleChoice.NOT_A_CHOICE when it is not one of
+    its choices) instead of as text.
+    """
+
+    quiz_session = models.ForeignKey(
+        QuizSession, on_delete=models.CASCADE, related_name="answer_facts", db_index=False
+    )
+    student = models.ForeignKey(
+        QuizSessionStudent, on_delete=models.CASCADE, related_name="answer_facts"
+    )
+    question = models.ForeignKey(
+        QuestionMultipleChoice, on_delete=models.CASCADE, related_name="answer_facts"
+    )
+    choice = models.SmallIntegerField()
+    is_correct = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "api_answer_fact"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quiz_session", "question", "student"], name="unique_answer_fact"
+            ),
+        ]
 
 
 class QuizSessionQuestion(models.Model):
@@ -237,6 +398,38 @@ class QuizSessionQuestion(models.Model):
     class Meta:
         db_table = "api_quiz_session_question"
         unique_together = ("quiz_session", "question")
+        indexes = [
+            # The graded (not skipped) questions of a session, without reading the table.
+            models.Index(
+                fields=["quiz_session", "skipped", "question"], name="session_question_skipped_idx"
+            ),
+        ]
+
+
+class QuizSessionSummary(models.Model):
+    """Facts about a finished session, written when it is graded so listings need no COUNTs."""
+
+    quiz_session = models.OneToOneField(
+        QuizSession, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    participant_count = models.IntegerField(default=0)
+    response_count = models.IntegerField(default=0)
+    mean_score = models.FloatField(null=True, blank=True)
+    question_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "api_quiz_session_summary"
+
+    def to_json(self):
+        return {
+            "participant_count": self.participant_count,
+            "response_count": self.response_count,
+            "mean_score": self.mean_score,
+            "question_count": self.question_count,
+            "skipped_count": self.skipped_count,
+        }
 
 
 class ContactMessage(models.Model):
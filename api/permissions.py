@@ -107,11 +107,14 @@ class IsSessionOwner(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        # Get recording_id from path parameters
-        session_code = view.kwargs.get("code")
+        # Sessions are named by code, or by id where the code may have been recycled.
+        if view.kwargs.get("session_id") is not None:
+            lookup = {"id": view.kwargs["session_id"]}
+        else:
+            lookup = {"code": view.kwargs.get("code")}
 
         try:
-            session = QuizSession.objects.get(code=session_code)
+            session = QuizSession.objects.get(**lookup)
         except (ObjectDoesNotExist, MultipleObjectsReturned, FieldError):
             return False
         return request.user == session.quiz.instructor.user
@@ -1,8 +1,12 @@
+import base64
+
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import EmailValidator
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
 
+from . import codec
 from .constants import ROLES
 from .models import (
     ContactMessage,
@@ -144,11 +148,11 @@ class QuizSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         return super().update(instance, validated_data)
 
-    def get_num_questions(self, obj):
-        return QuestionMultipleChoice.objects.filter(quiz__id=obj.id).count()
+    def get_num_questions(self, obj) -> int:
+        return obj.count_questions()
 
-    def get_num_sessions(self, obj):
-        return QuizSession.objects.filter(quiz__id=obj.id).count()
+    def get_num_sessions(self, obj) -> int:
+        return obj.count_sessions()
 
 
 class CreateQuizFromTranscriptRequestSerializer(serializers.Serializer):
@@ -241,11 +245,11 @@ class FetchCourseQuizzesSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at"]
 
-    def get_num_questions(self, obj):
-        return QuestionMultipleChoice.objects.filter(quiz__id=obj.id).count()
+    def get_num_questions(self, obj) -> int:
+        return obj.count_questions()
 
-    def get_num_sessions(self, obj):
-        return QuizSession.objects.filter(quiz__id=obj.id).count()
+    def get_num_sessions(self, obj) -> int:
+        return obj.count_sessions()
 
 
 class RecordingTitleUpdateSerializer(serializers.Serializer):
@@ -434,6 +438,41 @@ class ScoreQuizResponseSerializer(serializers.Serializer):
     message = serializers.CharField()
 
 
+class GradeDistributionQuerySerializer(serializers.Serializer):
+    bin_width = serializers.FloatField(required=False, min_value=0.01, max_value=100)
+    usernames = serializers.BooleanField(required=False, default=True)
+    usernames_limit = serializers.IntegerField(required=False, min_value=0)
+    usernames_offset = serializers.IntegerField(required=False, min_value=0, default=0)
+
+
+class ResultsExportQuerySerializer(serializers.Serializer):
+    # Not "format", which DRF reserves for picking a renderer.
+    export_format = serializers.ChoiceField(choices=["csv", "jsonl"], required=False, default="csv")
+
+
+class SessionPageQuerySerializer(serializers.Serializer):
+    DEFAULT_LIMIT = 50
+
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=200)
+    cursor = serializers.CharField(required=False)
+
+    @staticmethod
+    def encode_cursor(start_time, session_id) -> str:
+        value = codec.dumps_bytes([start_time.isoformat(), session_id])
+        return base64.urlsafe_b64encode(value).decode()
+
+    def validate_cursor(self, value):
+        """Decode the (start_time, id) of the last session on the previous page."""
+        try:
+            start_time, session_id = codec.loads(base64.urlsafe_b64decode(value.encode()))
+            start_time = parse_datetime(start_time)
+        except (ValueError, TypeError):
+            start_time = None
+        if start_time is None or not isinstance(session_id, int):
+            raise serializers.ValidationError("Invalid cursor.")
+        return start_time, session_id
+
+
 class GetScoreRequestSerializer(serializers.Serializer):
     student_id = serializers.IntegerField()
     quiz_session_id = serializers.IntegerField()
@@ -1,38 +1,428 @@
-from typing import Dict
+import math
+import sqlite3
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from django.db.models import Case, Count, IntegerField, When
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Cast, Coalesce, Floor, Greatest, RowNumber
 
-from .models import QuizSessionQuestion, QuizSessionStudent, UserResponse
+from .models import (
+    AnswerFact,
+    QuestionMultipleChoice,
+    QuizSessionQuestion,
+    QuizSessionStudent,
+    QuizSessionSummary,
+    UserResponse,
+)
+
+
+_SCORE_SESSION_SQL = """
+    UPDATE {student} AS student
+    SET score = scores.correct
+    FROM (
+        SELECT s.id AS student_id, COUNT(r.id) AS correct
+        FROM {student} AS s
+        LEFT JOIN {response} AS r
+            ON r.student_id = s.id
+            AND r.quiz_session_id = s.quiz_session_id
+            AND r.is_correct
+            AND r.question_id IN (
+                SELECT q.question_id FROM {session_question} AS q
+                WHERE q.quiz_session_id = %s AND NOT q.skipped
+            )
+        WHERE s.quiz_session_id = %s
+        GROUP BY s.id
+    ) AS scores
+    WHERE student.id = scores.student_id
+    RETURNING id, score
+"""
+
+
+def _supports_update_from():
+    if connection.vendor == "postgresql":
+        return True
+    # UPDATE ... FROM arrived in SQLite 3.33 and RETURNING in 3.35.
+    return connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def _score_session_update_from(session_id) -> Dict[int, int]:
+    sql = _SCORE_SESSION_SQL.format(
+        student=QuizSessionStudent._meta.db_table,
+        response=UserResponse._meta.db_table,
+        session_question=QuizSessionQuestion._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [session_id, session_id])
+        return dict(cursor.fetchall())
+
+
+def _correct_answer_count(session_id, question_ids=None):
+    """Per-student (OuterRef("pk")) count of correct answers on the session's scored questions."""
+    if question_ids is None:
+        question_ids = QuizSessionQuestion.objects.filter(
+            quiz_session_id=session_id, skipped=False
+        ).values("question_id")
+    correct = (
+        UserResponse.objects.filter(
+            quiz_session_id=session_id,
+            student_id=OuterRef("pk"),
+            question_id__in=question_ids,
+            is_correct=True,
+        )
+        .order_by()
+        .values("student_id")
+        .annotate(correct=Count("id"))
+        .values("correct")
+    )
+    return Coalesce(Subquery(correct), 0)
+
+
+def _score_session_subquery(session_id) -> Dict[int, int]:
+    students = QuizSessionStudent.objects.filter(quiz_session_id=session_id)
+    students.update(score=_correct_answer_count(session_id))
+    return dict(students.values_list("id", "score"))
+
+
+def expected_scores(session_id) -> Dict[int, int]:
+    """The scores score_session would write, without writing them."""
+    return dict(
+        QuizSessionStudent.objects.filter(quiz_session_id=session_id)
+        .annotate(expected=_correct_answer_count(session_id))
+        .values_list("id", "expected")
+    )
+
+
+def adjust_scores(score_changes: Dict[int, int]):
+    """
+    Add each change to the student's running score, one UPDATE per distinct change.
+    Ungraded students (score -1) start counting from 0, even when their change is 0: they
+    have answered a graded question, so they count in the session's statistics.
+    """
+    students_by_change = defaultdict(list)
+    for student_id, change in score_changes.items():
+        students_by_change[change].append(student_id)
+    for change, student_ids in students_by_change.items():
+        students = QuizSessionStudent.objects.filter(id__in=student_ids)
+        if change:
+            students.update(score=Greatest("score", 0) + change)
+        else:
+            students.filter(score__lt=0).update(score=0)
+
+
+def rescore_response(session_id, student_id, question_id, was_correct: bool, is_correct: bool):
+    """Apply a single answer write to the running score, for writes outside write_user_responses."""
+    if was_correct != is_correct and scored_question_ids(session_id, [question_id]):
+        adjust_scores({student_id: int(is_correct) - int(was_correct)})
+
+
+def scored_question_ids(session_id, question_ids) -> Set[int]:
+    """The questions among ``question_ids`` that count towards the session's scores."""
+    return set(
+        QuizSessionQuestion.objects.filter(
+            quiz_session_id=session_id, question_id__in=question_ids, skipped=False
+        ).values_list("question_id", flat=True)
+    )
+
+
+def unscore_question(session_id, question_id):
+    """Take a newly skipped question's correct answers back out of the running scores."""
+    QuizSessionStudent.objects.filter(
+        quiz_session_id=session_id,
+        responses__question_id=question_id,
+        responses__is_correct=True,
+    ).update(
+        score=Greatest("score", 0) - _correct_answer_count(session_id, question_ids=[question_id])
+    )
 
 
 def score_session(session_id) -> Dict[int, int]:
-    question_ids = QuizSessionQuestion.objects.filter(
-        quiz_session_id=session_id, skipped=False
-    ).values_list("question_id", flat=True)
-    if not question_ids:
+    """
+    Set every student's score to their number of correct answers on the session's
+    questions that were not skipped, in a single UPDATE statement. Safe to run again;
+    returns the scores by student id.
+    """
+    if not QuizSessionQuestion.objects.filter(quiz_session_id=session_id, skipped=False).exists():
         raise ValueError(f"Quiz session with id {session_id} does not exist")
 
-    # Directly get the only response per question per student
-    responses = UserResponse.objects.filter(
-        quiz_session_id=session_id, question_id__in=question_ids
+    if _supports_update_from():
+        return _score_session_update_from(session_id)
+    return _score_session_subquery(session_id)
+
+
+def summarize_session(session_id) -> QuizSessionSummary:
+    """Write (or rewrite) the session's summary from its students, responses and questions."""
+    students = QuizSessionStudent.objects.filter(quiz_session_id=session_id).aggregate(
+        participant_count=Count("id"), mean_score=Avg("score", filter=Q(score__gte=0))
+    )
+    questions = QuizSessionQuestion.objects.filter(quiz_session_id=session_id).aggregate(
+        question_count=Count("id"), skipped_count=Count("id", filter=Q(skipped=True))
+    )
+    summary, _ = QuizSessionSummary.objects.update_or_create(
+        quiz_session_id=session_id,
+        defaults={
+            **students,
+            **questions,
+            "response_count": UserResponse.objects.filter(quiz_session_id=session_id).count(),
+        },
+    )
+    return summary
+
+
+def _histogram_quantile(histogram: List[Tuple[float, int]], total: int, q: float) -> float:
+    """Linear-interpolated quantile (like numpy's default) of a sorted value histogram."""
+    position = q * (total - 1)
+    lower_index, fraction = int(position), position - int(position)
+
+    def value_at(index):
+        seen = 0
+        for value, count in histogram:
+            seen += count
+            if index < seen:
+                return value
+
+    lower = value_at(lower_index)
+    if fraction == 0:
+        return lower
+    return lower + (value_at(lower_index + 1) - lower) * fraction
+
+
+def _grade_statistics(histogram: List[Tuple[float, int]]) -> Optional[Dict[str, float]]:
+    total = sum(count for _, count in histogram)
+    if total == 0:
+        return None
+    mean = sum(value * count for value, count in histogram) / total
+    variance = sum(count * (value - mean) ** 2 for value, count in histogram) / total
+    return {
+        "mean": round(mean, 2),
+        "median": round(_histogram_quantile(histogram, total, 0.5), 2),
+        "stdev": round(math.sqrt(variance), 2),
+        "q1": round(_histogram_quantile(histogram, total, 0.25), 2),
+        "q3": round(_histogram_quantile(histogram, total, 0.75), 2),
+        "min": histogram[0][0],
+        "max": histogram[-1][0],
+    }
+
+
+def grade_distribution(
+    session_id,
+    bin_width: Optional[float] = None,
+    include_usernames: bool = True,
+    usernames_limit: Optional[int] = None,
+    usernames_offset: int = 0,
+) -> dict:
+    """
+    Histogram of a graded session's scores as percentages of its non-skipped questions.
+
+    Counts come from one GROUP BY over the students' scores, so the work does not grow with
+    class size. Without ``bin_width`` every distinct percentage is its own bucket; otherwise
+    percentages are grouped into buckets starting at multiples of ``bin_width``. Usernames
+    are fetched with one windowed query, ``usernames_limit`` per bucket after skipping
+    ``usernames_offset``. Statistics are computed from the histogram.
+    """
+    question_count = QuizSessionQuestion.objects.filter(
+        quiz_session_id=session_id, skipped=False
+    ).count()
+    if question_count == 0:
+        raise ValueError(f"Quiz session with id {session_id} has no graded questions")
+
+    def percentage(score):
+        return round(score / question_count * 100, 2)
+
+    def bucket_of(score):
+        if bin_width is None:
+            return percentage(score)
+        return round(math.floor(score * 100 / (question_count * bin_width)) * bin_width, 2)
+
+    graded = QuizSessionStudent.objects.filter(quiz_session_id=session_id, score__gte=0)
+    histogram = list(
+        graded.order_by("score")
+        .values("score")
+        .annotate(count=Count("id"))
+        .values_list("score", "count")
+    )
+
+    buckets: Dict[float, dict] = {}
+    for score, count in histogram:
+        bucket = buckets.setdefault(bucket_of(score), {"percentage": bucket_of(score), "count": 0})
+        bucket["count"] += count
+
+    if include_usernames:
+        for bucket in buckets.values():
+            bucket["usernames"] = []
+        if bin_width is None:
+            partition = F("score")
+        else:
+            partition = Floor(Cast("score", FloatField()) * 100 / (question_count * bin_width))
+        rows = graded.annotate(
+            position=Window(RowNumber(), partition_by=[partition], order_by=F("id").asc())
+        ).filter(position__gt=usernames_offset)
+        if usernames_limit is not None:
+            rows = rows.filter(position__lte=usernames_offset + usernames_limit)
+        for score, username in rows.order_by("score", "id").values_list("score", "username"):
+            buckets[bucket_of(score)]["usernames"].append(username)
+
+    return {
+        "question_count": question_count,
+        "student_count": sum(count for _, count in histogram),
+        "bin_width": bin_width,
+        "buckets": sorted(buckets.values(), key=lambda bucket: bucket["percentage"]),
+        "statistics": _grade_statistics([(percentage(s), count) for s, count in histogram]),
+    }
+
+
+def session_question_ids(session_id) -> List[int]:
+    """Ids of the questions served in a session, in the order they were served."""
+    # A session's question row is created when the question is served.
+    return list(
+        QuizSessionQuestion.objects.filter(quiz_session_id=session_id)
+        .order_by("id")
+        .values_list("question_id", flat=True)
     )
 
-    # Calculate the score for each student
-    student_scores = responses.values("student_id").annotate(
-        score=Count(Case(When(is_correct=True, then=1), output_field=IntegerField()))
+
+def iter_session_results(session_id, chunk_size=2000) -> Iterator[dict]:
+    """
+    Yield every student's results (username, correct, answered and their answer per question
+    id) in student id order. Students and responses are read through two server-side cursors
+    sorted by student and merged, so memory stays flat however many responses the session has.
+    When a student answered a question more than once, the last answer counts.
+    """
+    students = (
+        QuizSessionStudent.objects.filter(quiz_session_id=session_id)
+        .order_by("id")
+        .values_list("id", "username")
+        .iterator(chunk_size=chunk_size)
     )
+    responses = (
+        UserResponse.objects.filter(quiz_session_id=session_id)
+        .order_by("student_id", "id")
+        .values_list("student_id", "question_id", "selected_answer", "is_correct")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    response = next(responses, None)
+    for student_id, username in students:
+        while response is not None and response[0] < student_id:
+            response = next(responses, None)
+        answers, correct = {}, {}
+        while response is not None and response[0] == student_id:
+            _, question_id, selected_answer, is_correct = response
+            answers[question_id] = selected_answer
+            correct[question_id] = bool(is_correct)
+            response = next(responses, None)
+        yield {
+            "username": username,
+            "correct": sum(correct.values()),
+            "answered": len(answers),
+            "answers": answers,
+        }
 
-    student_ids = QuizSessionStudent.objects.filter(quiz_session_id=session_id).values_list(
-        "id", flat=True
+
+def write_answer_facts(
+    session_id,
+    responses: Iterable[UserResponse],
+    choice_ids: Optional[Dict[Tuple[int, int], int]] = None,
+):
+    """
+    Upsert the answer facts of a session's responses, with one INSERT ... ON CONFLICT.
+    ``choice_ids`` holds the choice ids already known by (student_id, question_id); the
+    others are looked up in the questions' choice_history.
+    """
+    responses = list(responses)
+    choice_ids = dict(choice_ids or {})
+    unknown = [r for r in responses if (r.student_id, r.question_id) not in choice_ids]
+    if unknown:
+        questions = {
+            question.id: question
+            for question in QuestionMultipleChoice.objects.filter(
+                id__in={response.question_id for response in unknown}
+            ).only("id", "correct_answer", "incorrect_answer_list", "choice_history")
+        }
+        QuestionMultipleChoice.record_choice_histories(questions.values())
+        for response in unknown:
+            choice_ids[(response.student_id, response.question_id)] = questions[
+                response.question_id
+            ].choice_id(response.selected_answer)
+
+    AnswerFact.objects.bulk_create(
+        [
+            AnswerFact(
+                quiz_session_id=session_id,
+                student_id=response.student_id,
+                question_id=response.question_id,
+                choice=choice_ids[(response.student_id, response.question_id)],
+                is_correct=bool(response.is_correct),
+            )
+            for response in responses
+        ],
+        update_conflicts=True,
+        unique_fields=["quiz_session", "question", "student"],
+        update_fields=["choice", "is_correct"],
     )
-    student_id_to_score = {id: 0 for id in student_ids}
-    student_id_to_score.update({entry["student_id"]: entry["score"] for entry in student_scores})
 
-    students_to_update = [
-        QuizSessionStudent(id=student_id, score=score)
-        for student_id, score in student_id_to_score.items()
+
+def write_user_responses(session_id, responses: Iterable[dict]) -> Set[int]:
+    """
+    Upsert a batch of answers for a session with a single INSERT ... ON CONFLICT, whatever
+    the batch size. Each response is a dict with student_id, question_id, selected_answer,
+    is_correct and optionally the choice_id of the answer; when a student answered a
+    question more than once, the last one wins.
+    Returns the ids of the questions that were answered.
+    """
+    latest = {(r["student_id"], r["question_id"]): r for r in responses}
+    if not latest:
+        return set()
+
+    question_ids = {question_id for _, question_id in latest}
+    # Students removed from the session after answering are dropped.
+    student_ids = set(
+        QuizSessionStudent.objects.filter(
+            quiz_session_id=session_id, id__in={student_id for student_id, _ in latest}
+        ).values_list("id", flat=True)
+    )
+
+    rows = [
+        UserResponse(
+            quiz_session_id=session_id,
+            student_id=response["student_id"],
+            question_id=response["question_id"],
+            selected_answer=response["selected_answer"],
+            is_correct=response["is_correct"],
+        )
+        for key, response in latest.items()
+        if key[0] in student_ids
     ]
+    choice_ids = {
+        key: response["choice_id"] for key, response in latest.items() if "choice_id" in response
+    }
+
+    with transaction.atomic():
+        score_changes = defaultdict(int)
+        scored = scored_question_ids(session_id, question_ids)
+        if scored:
+            # The running scores need the answers being replaced, but only for served questions.
+            previous = {
+                (student_id, question_id): is_correct
+                for student_id, question_id, is_correct in UserResponse.objects.filter(
+                    quiz_session_id=session_id, question_id__in=scored, student_id__in=student_ids
+                ).values_list("student_id", "question_id", "is_correct")
+            }
+            for row in rows:
+                if row.question_id in scored:
+                    score_changes[row.student_id] += bool(row.is_correct) - bool(
+                        previous.get((row.student_id, row.question_id))
+                    )
 
-    QuizSessionStudent.objects.bulk_update(students_to_update, ["score"])
+        # One INSERT ... ON CONFLICT, so concurrent writes of the same answer cannot
+        # create duplicates.
+        UserResponse.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["quiz_session", "question", "student"],
+            update_fields=["selected_answer", "is_correct"],
+        )
+        write_answer_facts(session_id, rows, choice_ids)
+        adjust_scores(score_changes)
 
-    return student_id_to_score
+    return question_ids
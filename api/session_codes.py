@@ -0,0 +1,128 @@
+"""
+Session code allocation.
+
+Codes are handed out from a counter rather than drawn at random and probed: each session takes
+the next position of ``SessionCodeCounter`` and the position is mapped to a code through a keyed
+Feistel permutation of the code space, so consecutive sessions get unrelated codes and no two
+positions within a cycle share one. Once the counter wraps around the code space, codes come
+back in the same order and are taken from sessions that ended (or were abandoned) more than
+``SESSION_CODE_RETENTION_DAYS`` ago. Those sessions keep their results, which are served by
+session id under ``sessions/<id>/results/``.
+"""
+
+import hashlib
+import string
+from datetime import timedelta
+from functools import lru_cache
+from typing import Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import QuizSession, SessionCodeCounter
+from .services import _supports_update_from
+
+ALPHABET = "".join(c for c in string.ascii_uppercase + string.digits if c not in {"I", "O", "0"})
+CODE_LENGTH = 5
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# The permutation runs on the smallest even number of bits covering the code space and walks
+# the cycle until it lands back inside it (on average less than twice).
+_HALF_BITS = ((CODE_SPACE - 1).bit_length() + 1) // 2
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+_NEXT_POSITION_SQL = """
+    UPDATE {counter} SET position = position + 1 WHERE id = %s RETURNING position
+"""
+_COUNTER_ID = 1
+
+
+@lru_cache(maxsize=1)
+def _round_keys(secret: str) -> Tuple[bytes, ...]:
+    return tuple(
+        hashlib.blake2b(f"{secret}:{n}".encode(), digest_size=16, person=b"session-code").digest()
+        for n in range(_ROUNDS)
+    )
+
+
+def _round(half: int, key: bytes) -> int:
+    digest = hashlib.blake2b(half.to_bytes(4, "big"), digest_size=4, key=key).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+
+def permute(position: int) -> int:
+    """Map a position in ``range(CODE_SPACE)`` to another one, one-to-one."""
+    keys = _round_keys(settings.SECRET_KEY)
+    value = position
+    while True:
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for key in keys:
+            left, right = right, left ^ _round(right, key)
+        value = (left << _HALF_BITS) | right
+        if value < CODE_SPACE:
+            return value
+
+
+def encode(value: int) -> str:
+    characters = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        characters.append(ALPHABET[digit])
+    return "".join(reversed(characters))
+
+
+def code_at(position: int) -> str:
+    return encode(permute(position % CODE_SPACE))
+
+
+def _next_position() -> int:
+    if _supports_update_from():
+        sql = _NEXT_POSITION_SQL.format(counter=SessionCodeCounter._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_COUNTER_ID])
+            row = cursor.fetchone()
+        if row is not None:
+            return row[0] - 1
+    else:
+        with transaction.atomic():
+            counters = SessionCodeCounter.objects.filter(id=_COUNTER_ID)
+            if counters.update(position=F("position") + 1):
+                return counters.values_list("position", flat=True).get() - 1
+    # The counter row is created by its migration; only a flushed database lacks it.
+    SessionCodeCounter.objects.get_or_create(id=_COUNTER_ID)
+    return _next_position()
+
+
+def release_stale_code(code: str) -> int:
+    """Take ``code`` from a session that ended or was abandoned before the retention window."""
+    cutoff = timezone.now() - timedelta(days=settings.SESSION_CODE_RETENTION_DAYS)
+    return (
+        QuizSession.objects.filter(code=code)
+        .filter(Q(end_time__lt=cutoff) | Q(end_time__isnull=True, start_time__lt=cutoff))
+        .update(code=None)
+    )
+
+
+def allocate_code() -> str:
+    position = _next_position()
+    code = code_at(position)
+    if position >= CODE_SPACE:
+        release_stale_code(code)
+    return code
+
+
+def create_quiz_session(**fields) -> QuizSession:
+    """Create a session with the next free code in a single INSERT."""
+    while True:
+        code = allocate_code()
+        try:
+            with transaction.atomic():
+                return QuizSession.objects.create(code=code, **fields)
+        except IntegrityError:
+            # Codes drawn at random before the counter existed, or still inside the retention
+            # window, are skipped; anything else is not ours to retry.
+            if not QuizSession.objects.filter(code=code).exists():
+                raise
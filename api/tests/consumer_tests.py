@@ -1,9 +1,13 @@
 import asyncio
+from unittest.mock import patch
 
 import pytest
 from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import OperationalError
 from django.test import TestCase
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -15,8 +19,13 @@ from api.models import (
     Quiz,
     QuizSession,
     QuizSessionStudent,
+    QuizSessionSummary,
     UserResponse,
 )
+from api import consumers
+from api.consumers import GRADING_CHANNEL, GradingConsumer
+from api.live_session import clear_live_sessions, peek_live_session
+from api.services import score_session
 from hice_backend.asgi import application
 
 import random
@@ -25,9 +34,21 @@ from .test_services import BaseQuizTest
 from typing import List
 
 
+async def receive_until(communicator, message_type, timeout):
+    """Read frames up to the first ``message_type`` one; returns it and the frames before it."""
+    skipped = []
+    while True:
+        response = await communicator.receive_json_from(timeout=timeout)
+        if response["type"] == message_type:
+            return response, skipped
+        skipped.append(response)
+
+
 @pytest.mark.asyncio
 @pytest.mark.django_db
 async def test_quiz():
+    clear_live_sessions()
+
     # ----------------------------
     # Create a User for Instructor
     # ----------------------------
@@ -234,8 +255,7 @@ async def test_quiz():
     # Receive 'quiz_ended' response
     # ----------------------------
     try:
-        response = await communicator.receive_json_from(timeout=5)
-        assert response["type"] == "quiz_ended", "Expected 'quiz_ended' message"
+        response, _ = await receive_until(communicator, "quiz_ended", timeout=5)
         assert "grades" in response, "'grades' not in response"
 
         # Expected grades based on variance
@@ -392,14 +412,13 @@ class StudentConsumerReconnectTest(BaseQuizTest):
         assert response["type"] == "answer", "Expected 'answer' confirmation"
         assert response["status"] == "success", "Answer submission failed"
 
-        # Verify instructor receives the response (both update_answers and user_response)
-        response = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
-        assert response["type"] == "update_answers", "Instructor didn't receive answer update"
-
-        response = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
-        assert response["type"] == "user_response", "Instructor didn't receive user response"
+        # Verify instructor receives one combined update with the new counts
+        update = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
+        assert update["type"] == "update_answers", "Instructor didn't receive answer update"
+        assert update["new_responses"] == 1
+        assert update["question_id"] == self.questions[question_index]["id"]
 
-        return response
+        return update
 
     async def perform_reconnect(self, student_index):
         student = self.students[student_index]
@@ -447,6 +466,8 @@ class StudentConsumerReconnectTest(BaseQuizTest):
             "Reconnected student didn't receive current question"
         )
         assert response["question"]["question_text"] == self.questions[1]["question_text"]
+        assert "correct_answer" not in response["question"], "Student payload leaks the answer key"
+        assert self.questions[1]["correct_answer"] in response["question"]["choices"]
 
         await self.cleanup()
 
@@ -485,7 +506,410 @@ class StudentConsumerReconnectTest(BaseQuizTest):
 
         # End quiz
         await self.instructor_communicator.send_json_to({"type": "next_question"})
-        response = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
-        assert response["type"] == "quiz_ended", "Expected 'quiz_ended' message"
+        await receive_until(self.instructor_communicator, "quiz_ended", timeout=self.timeout)
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_buffered_answers_are_written_before_grading(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        await receive_until(self.instructor_communicator, "quiz_ended", timeout=self.timeout)
+
+        response_count = await sync_to_async(
+            UserResponse.objects.filter(quiz_session=self.session).count
+        )()
+        assert response_count == self.student_count * self.question_count
+
+        scores = await sync_to_async(
+            lambda: {
+                s.id: s.score for s in QuizSessionStudent.objects.filter(quiz_session=self.session)
+            }
+        )()
+        for student_index, student in enumerate(self.students):
+            assert scores[student["id"]] == self.student_grades[student_index]
+
+        await self.cleanup()
+
+    async def answer_every_question(self):
+        for question_index in range(self.question_count):
+            await self.serve_question(question_index)
+            for student_index in range(self.student_count):
+                await self.submit_student_answer(student_index, question_index)
+
+    @pytest.mark.asyncio
+    async def test_grading_streams_progress(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        response, progress = await receive_until(
+            self.instructor_communicator, "quiz_ended", timeout=self.timeout
+        )
+        assert [frame["type"] for frame in progress] == ["grading_started"] + [
+            "grading_progress"
+        ] * 4
+        assert [frame["stage"] for frame in progress[1:]] == [
+            "flushing_answers",
+            "scoring",
+            "summarizing",
+            "grade_distribution",
+        ]
+        assert sum(len(usernames) for usernames in response["grades"].values()) == 2
+        summary = await sync_to_async(QuizSessionSummary.objects.get)(quiz_session=self.session)
+        assert (summary.participant_count, summary.response_count, summary.question_count) == (
+            2,
+            6,
+            3,
+        )
+
+        _, frames = await receive_until(
+            self.students[0]["communicator"], "grading_completed", timeout=self.timeout
+        )
+        assert [frame["type"] for frame in frames] == [
+            "quiz_ended",
+            "grading_started",
+            "grading_progress",
+            "grading_progress",
+            "grading_progress",
+            "grading_progress",
+            "grade",
+        ]
+        assert await sync_to_async(peek_live_session)(self.code) is None
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_students_receive_their_grade_on_completion(self):
+        await self.setUp_quiz_environment()
+        for question_index in range(self.question_count):
+            await self.serve_question(question_index)
+            for student_index in range(self.student_count):
+                await self.submit_student_answer(student_index, question_index)
+            if question_index == 0:
+                # The grade follows a student to the channel they reconnected on.
+                await self.perform_reconnect(1)
+                response = await self.students[1]["communicator"].receive_json_from(
+                    timeout=self.timeout
+                )
+                assert response["type"] == "next_question"
+
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        for student_index, student in enumerate(self.students):
+            grade, _ = await receive_until(student["communicator"], "grade", timeout=self.timeout)
+            assert grade == {
+                "type": "grade",
+                "grade": self.student_grades[student_index],
+                "question_count": self.question_count,
+                "skipped": 0,
+            }
+            response = await student["communicator"].receive_json_from(timeout=self.timeout)
+            assert response["type"] == "grading_completed"
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_grading_is_retried(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+
+        failures = [OperationalError("database is locked")]
+
+        def flaky_score_session(session_id):
+            if failures:
+                raise failures.pop()
+            return score_session(session_id)
+
+        with self.settings(GRADING_RETRY_DELAY=0):
+            with patch("api.consumers.score_session", flaky_score_session):
+                await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+                response, progress = await receive_until(
+                    self.instructor_communicator, "quiz_ended", timeout=self.timeout
+                )
+
+        assert [frame["attempt"] for frame in progress[1:]] == [1, 1, 2, 2, 2, 2]
+        scores = await sync_to_async(
+            lambda: list(
+                QuizSessionStudent.objects.filter(quiz_session=self.session).values_list(
+                    "score", flat=True
+                )
+            )
+        )()
+        assert sorted(scores) == sorted(self.student_grades)
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_grading_failure_keeps_live_session(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+
+        failure = OperationalError("database is locked")
+        with self.settings(GRADING_RETRY_DELAY=0, GRADING_MAX_ATTEMPTS=2):
+            with patch("api.consumers.score_session", side_effect=failure):
+                await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+                response, _ = await receive_until(
+                    self.instructor_communicator, "grading_failed", timeout=self.timeout
+                )
+
+        assert response["message"] == "database is locked"
+        assert await sync_to_async(peek_live_session)(self.code) is not None
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_answers_after_the_end_are_rejected(self):
+        await self.setUp_quiz_environment()
+        await self.serve_question(0)
+        student = self.students[0]
+        response = await student["communicator"].receive_json_from(timeout=self.timeout)
+        assert response["type"] == "next_question"
+
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        await receive_until(self.instructor_communicator, "quiz_ended", timeout=self.timeout)
+        await student["communicator"].send_json_to(
+            {
+                "type": "response",
+                "data": {
+                    "student": {"id": student["id"]},
+                    "question_id": self.questions[0]["id"],
+                    "selected_answer": self.questions[0]["correct_answer"],
+                },
+            }
+        )
+        response, _ = await receive_until(student["communicator"], "error", timeout=self.timeout)
+        assert response["message"] == "The quiz has ended"
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_quiz_with_every_question_skipped(self):
+        await self.setUp_quiz_environment()
+        await self.serve_question(0)
+        # Skipping serves the next question; skipping the last one ends the quiz.
+        for question in self.questions:
+            await self.instructor_communicator.send_json_to(
+                {"type": "skip_question", "question_id": question["id"]}
+            )
+
+        response, progress = await receive_until(
+            self.instructor_communicator, "quiz_ended", timeout=self.timeout
+        )
+        assert response["grades"] == {"error": "No questions in the quiz."}
+        assert [frame["attempt"] for frame in progress if frame["type"] == "grading_progress"] == [
+            1
+        ] * 4
+        await receive_until(
+            self.students[0]["communicator"], "grading_completed", timeout=self.timeout
+        )
+        assert await sync_to_async(peek_live_session)(self.code) is None
 
         await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_sessions_that_are_not_running_are_not_loaded(self):
+        await sync_to_async(QuizSession.objects.filter(id=self.session.id).update)(
+            end_time=timezone.now()
+        )
+        communicator = WebsocketCommunicator(
+            application, f"/ws/student/join/{self.code}/?username=late"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        await communicator.send_json_to({"type": "join", "username": "late"})
+        response = await communicator.receive_json_from(timeout=self.timeout)
+        assert response == {"type": "error", "message": "This quiz session is not running."}
+        assert (await communicator.receive_output(timeout=self.timeout))["type"] == (
+            "websocket.close"
+        )
+
+        unknown = WebsocketCommunicator(application, "/ws/student/join/NOPE1/?username=late")
+        connected, _ = await unknown.connect()
+        assert connected
+        await unknown.send_json_to({"type": "reconnect", "student_id": 1})
+        response = await unknown.receive_json_from(timeout=self.timeout)
+        assert response["type"] == "reconnect_failed"
+        await unknown.disconnect()
+
+        for code in (self.code, "NOPE1"):
+            assert await sync_to_async(peek_live_session)(code) is None
+        students = QuizSessionStudent.objects.filter(quiz_session=self.session)
+        assert not await sync_to_async(students.exists)()
+
+    @pytest.mark.asyncio
+    async def test_finished_tasks_are_forgotten(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        await receive_until(self.instructor_communicator, "quiz_ended", timeout=self.timeout)
+
+        for tasks in (consumers._flush_tasks, consumers._grading_tasks):
+            if self.code in tasks:
+                await asyncio.wait([tasks[self.code]])
+            await asyncio.sleep(0)
+            assert self.code not in tasks
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_ended_session_is_not_reloaded_by_delayed_work(self):
+        await self.setUp_quiz_environment()
+        await self.serve_question(0)
+        await self.submit_student_answer(0, 0)
+
+        # The answer is still buffered, with a flush pending, when the quiz ends.
+        await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+        await receive_until(
+            self.students[0]["communicator"], "grading_completed", timeout=self.timeout
+        )
+        assert await sync_to_async(peek_live_session)(self.code) is None
+
+        await asyncio.sleep(settings.ANSWER_FLUSH_INTERVAL + 1 / settings.ANSWER_UPDATES_PER_SECOND)
+        assert await sync_to_async(peek_live_session)(self.code) is None
+
+        # Other workers cannot cancel their delayed work; it finds the session gone.
+        with self.settings(ANSWER_FLUSH_INTERVAL=0):
+            await consumers._flush_responses_later(self.code)
+        assert await sync_to_async(consumers._answer_update_events)(self.code, {1: 1}) == []
+        assert await sync_to_async(peek_live_session)(self.code) is None
+        responses = UserResponse.objects.filter(quiz_session=self.session)
+        assert await sync_to_async(responses.count)() == 1
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_grading_worker_channel(self):
+        await self.setUp_quiz_environment()
+        await self.answer_every_question()
+
+        with self.settings(GRADING_BACKEND="worker"):
+            await self.instructor_communicator.send_json_to({"type": "end_quiz"})
+            message = await get_channel_layer().receive(GRADING_CHANNEL)
+        assert message == {
+            "type": "grade_session",
+            "code": self.code,
+            "session_id": self.session.id,
+        }
+
+        await GradingConsumer().grade_session(message)
+        response, _ = await receive_until(
+            self.instructor_communicator, "quiz_ended", timeout=self.timeout
+        )
+        assert "grades" in response
+
+        await self.cleanup()
+
+    async def submit_answers_without_waiting(self, question_index):
+        for student_index, student in enumerate(self.students):
+            response = await student["communicator"].receive_json_from(timeout=self.timeout)
+            assert response["type"] == "next_question", "Student didn't receive question"
+
+            await student["communicator"].send_json_to(
+                {
+                    "type": "response",
+                    "data": {
+                        "student": {"id": student["id"]},
+                        "question_id": self.questions[question_index]["id"],
+                        "selected_answer": self.student_responses[student_index][question_index],
+                    },
+                }
+            )
+            response = await student["communicator"].receive_json_from(timeout=self.timeout)
+            assert response["status"] == "success", "Answer submission failed"
+
+    @pytest.mark.asyncio
+    async def test_answer_updates_are_coalesced(self):
+        await self.setUp_quiz_environment()
+        await self.serve_question(0)
+        await self.submit_answers_without_waiting(0)
+
+        update = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
+        assert update["type"] == "update_answers"
+        assert update["new_responses"] == self.student_count
+        assert update["data"]["total_responses"] == self.student_count
+        assert await self.instructor_communicator.receive_nothing(timeout=0.5)
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_answers_by_choice_index(self):
+        await self.setUp_quiz_environment()
+        question = await self.serve_question(0)
+        student = self.students[0]
+        response = await student["communicator"].receive_json_from(timeout=self.timeout)
+        assert response["type"] == "next_question"
+
+        choices = QuestionMultipleChoice.choices_of(
+            question["correct_answer"], question["incorrect_answer_list"]
+        )
+        for choice in (choices.index(question["correct_answer"]), len(choices)):
+            await student["communicator"].send_json_to(
+                {
+                    "type": "response",
+                    "data": {
+                        "student": {"id": student["id"]},
+                        "question_id": question["id"],
+                        "choice": choice,
+                    },
+                }
+            )
+            response = await student["communicator"].receive_json_from(timeout=self.timeout)
+            if choice < len(choices):
+                assert response["status"] == "success"
+                assert response["selected_answer"] == question["correct_answer"]
+                assert response["choice"] == choice
+            else:
+                assert response["type"] == "error"
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_answer_updates_hide_counts_without_live_bar_chart(self):
+        self.quiz.live_bar_chart = False
+        await sync_to_async(self.quiz.save)()
+
+        await self.setUp_quiz_environment()
+        await self.serve_question(0)
+        await self.submit_answers_without_waiting(0)
+
+        update = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
+        assert update["type"] == "update_answers"
+        assert update["new_responses"] == self.student_count
+        assert "data" not in update
+
+        await self.cleanup()
+
+    @pytest.mark.asyncio
+    async def test_preload_bundle_on_start(self):
+        with self.settings(QUIZ_PRELOAD_BUNDLE=True):
+            await self.setUp_quiz_environment()
+            await self.instructor_communicator.send_json_to({"type": "start"})
+            response = await self.instructor_communicator.receive_json_from(timeout=self.timeout)
+            assert response["type"] == "quiz_started"
+
+            communicator = self.students[0]["communicator"]
+            response = await communicator.receive_json_from(timeout=self.timeout)
+            assert response["type"] == "quiz_started"
+            bundle = response["bundle"]
+            assert bundle["version"] == 1
+            assert [q["id"] for q in bundle["questions"]] == [q["id"] for q in self.questions]
+            assert all("correct_answer" not in q for q in bundle["questions"])
+
+            question = await self.serve_question(0)
+            response = await communicator.receive_json_from(timeout=self.timeout)
+            assert response["type"] == "next_question"
+            assert set(response) == {"type", "question_id", "order"}
+            assert response["question_id"] == question["id"]
+
+            # Reconnecting students get the bundle again, then the current question id.
+            reconnected_communicator = await self.perform_reconnect(0)
+            response = await reconnected_communicator.receive_json_from(timeout=self.timeout)
+            assert response["type"] == "quiz_started"
+            assert response["bundle"] == bundle
+            response = await reconnected_communicator.receive_json_from(timeout=self.timeout)
+            assert response["type"] == "next_question"
+            assert response["question_id"] == question["id"]
+
+            await self.cleanup()
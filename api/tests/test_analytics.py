@@ -0,0 +1,117 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.analytics import item_analysis
+from api.models import AnswerFact, Instructor, QuizSession, QuizSessionStudent
+from api.services import write_user_responses
+
+from .test_services import BaseQuizTest
+
+# Each row is one student's answers to the three questions (Paris, 4, Blue are correct).
+ANSWERS = [
+    ["Paris", "4", "Blue"],
+    ["Paris", "4", "Red"],
+    ["Paris", "5", "Red"],
+    ["London", "4", None],
+    ["Berlin", "3", "Red"],
+]
+
+
+class ItemAnalysisTest(BaseQuizTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.session.end_time = timezone.now()
+        self.session.save()
+        second_session = QuizSession.objects.create(
+            code="TEST01", quiz=self.quiz, end_time=timezone.now()
+        )
+        # Students 0-2 took the first session, 3-4 the second.
+        for index, answers in enumerate(ANSWERS):
+            session = self.session if index < 3 else second_session
+            student = QuizSessionStudent.objects.create(
+                username=f"student_{index}", quiz_session=session
+            )
+            for question, answer in zip(self.question_records, answers):
+                if answer is not None:
+                    self._answer(student, question, answer)
+        # A changed answer.
+        self._answer(
+            QuizSessionStudent.objects.get(username="student_2"), self.question_records[2], "Blue"
+        )
+        self._answer(
+            QuizSessionStudent.objects.get(username="student_2"), self.question_records[2], "Red"
+        )
+
+    def _answer(self, student, question, answer):
+        write_user_responses(
+            student.quiz_session_id,
+            [
+                {
+                    "student_id": student.id,
+                    "question_id": question.id,
+                    "selected_answer": answer,
+                    "is_correct": answer == question.correct_answer,
+                }
+            ],
+        )
+
+    def test_item_statistics(self):
+        analysis = item_analysis(self.quiz.id)
+        self.assertEqual(analysis["session_count"], 2)
+        paris, four, blue = analysis["questions"]
+
+        self.assertEqual(paris["responses"], 5)
+        self.assertEqual(paris["p_value"], 0.6)
+        self.assertEqual(
+            paris["selection_rates"], {"Paris": 0.6, "London": 0.2, "Berlin": 0.2, "Madrid": 0.0}
+        )
+        self.assertEqual(blue["responses"], 4)
+        self.assertEqual(blue["p_value"], 0.25)
+        self.assertEqual(blue["selection_rates"]["Red"], 0.75)
+
+        # Point-biserial against the rest of each student's score, as a plain correlation.
+        correct = np.array([[1, 1, 1], [1, 1, 0], [1, 0, 0], [0, 1, 0], [0, 0, 0]])
+        rest = correct.sum(axis=1) - correct[:, 1]
+        self.assertAlmostEqual(
+            four["discrimination"], np.corrcoef(correct[:, 1], rest)[0, 1], places=4
+        )
+
+    def test_editing_the_choices_keeps_past_answers(self):
+        # "Amsterdam" now sorts first and "London" is gone; answers keep pointing at their text.
+        paris = self.question_records[0]
+        paris.incorrect_answer_list = ["Amsterdam", "Berlin", "Madrid"]
+        paris.save()
+        self.assertEqual(paris.choice_history, ["Berlin", "London", "Madrid", "Paris", "Amsterdam"])
+
+        rates = item_analysis(self.quiz.id)["questions"][0]["selection_rates"]
+        self.assertEqual(rates, {"Amsterdam": 0.0, "Berlin": 0.2, "Madrid": 0.0, "Paris": 0.6})
+
+    def test_unanswered_quiz(self):
+        AnswerFact.objects.all().delete()
+        analysis = item_analysis(self.quiz.id)
+        self.assertEqual(analysis["questions"][0]["responses"], 0)
+        self.assertIsNone(analysis["questions"][0]["p_value"])
+        self.assertIsNone(analysis["questions"][0]["selection_rates"]["Paris"])
+
+    def test_results_are_cached_until_another_session_ends(self):
+        first = item_analysis(self.quiz.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(item_analysis(self.quiz.id), first)
+
+        QuizSession.objects.create(code="TEST02", quiz=self.quiz, end_time=timezone.now())
+        self.assertEqual(item_analysis(self.quiz.id)["session_count"], 3)
+
+    def test_endpoint(self):
+        user = User.objects.create_user(username="owner", password="password")
+        self.quiz.instructor = Instructor.objects.create(user=user)
+        self.quiz.save()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.get(f"/quiz/{self.quiz.id}/item-analysis/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["questions"]), 3)
@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+
+from api import codec
+
+
+class CodecTest(SimpleTestCase):
+    def test_encodes_model_field_types(self):
+        value = {
+            "at": datetime(2024, 10, 1, 14, 0, 30, 250000, tzinfo=timezone.utc),
+            "id": uuid.UUID("5f0c1f7e-2b1d-4d3c-9a51-2a7a7c2e6d10"),
+            "score": Decimal("87.50"),
+        }
+        self.assertEqual(
+            codec.loads(codec.dumps(value)),
+            {
+                "at": "2024-10-01T14:00:30.250000+00:00",
+                "id": "5f0c1f7e-2b1d-4d3c-9a51-2a7a7c2e6d10",
+                "score": "87.50",
+            },
+        )
+
+    def test_grade_bucket_keys_match_stdlib(self):
+        self.assertEqual(codec.loads(codec.dumps({100.0: ["a"], 1: 2})), {"100.0": ["a"], "1": 2})
+
+    def test_parser_rejects_malformed_json(self):
+        with self.assertRaises(ParseError):
+            codec.JSONParser().parse(BytesIO(b"{not json"))
+
+    def test_json_response(self):
+        response = codec.JsonResponse({"message": "ok"}, status=201)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(codec.loads(response.content), {"message": "ok"})
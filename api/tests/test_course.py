@@ -7,8 +7,12 @@ from api.models import (
     InstructorRecordings,
     Student,
     CourseStudent,
+    QuestionMultipleChoice,
+    QuizSession,
 )
 import uuid
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -277,6 +281,47 @@ class FetchQuizzesByCourseTests(BaseCourseTest):
             self.assertTrue(expected_keys.issubset(quiz.keys()))
 
 
+class QuizListQueryCountTests(BaseCourseTest):
+    def add_quiz(self, question_count, session_count):
+        quiz = Quiz.objects.create(instructor=self.instructor, title="Quiz", course=self.course)
+        QuestionMultipleChoice.objects.bulk_create(
+            QuestionMultipleChoice(
+                quiz=quiz, question_text="?", incorrect_answer_list=["a"], correct_answer="b"
+            )
+            for _ in range(question_count)
+        )
+        QuizSession.objects.bulk_create(
+            QuizSession(quiz=quiz, code=uuid.uuid4().hex[:6]) for _ in range(session_count)
+        )
+        return quiz
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_instructor_1.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response.json()
+
+    def test_quiz_lists_use_a_fixed_number_of_queries(self):
+        for url, quizzes_of in [
+            (reverse("quizzes-by-course", kwargs={"course_id": self.course.id}), lambda r: r),
+            (reverse("instructor-quizzes"), lambda r: r["quizzes"]),
+        ]:
+            with self.subTest(url=url):
+                Quiz.objects.all().delete()
+                self.add_quiz(question_count=3, session_count=2)
+                queries, response = self.count_queries(url)
+                self.assertEqual(
+                    [(q["num_questions"], q["num_sessions"]) for q in quizzes_of(response)],
+                    [(3, 2)],
+                )
+
+                for question_count in range(4):
+                    self.add_quiz(question_count, session_count=1)
+                more_queries, response = self.count_queries(url)
+                self.assertEqual(len(quizzes_of(response)), 5)
+                self.assertEqual(more_queries, queries)
+
+
 class CourseRecordingsTests(CourseViewsTest):
     def setUp(self):
         super().setUp()
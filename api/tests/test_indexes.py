@@ -0,0 +1,131 @@
+from django.db import connection
+from django.test import TestCase
+
+from api import services
+from api.models import (
+    QuestionMultipleChoice,
+    Quiz,
+    QuizSession,
+    QuizSessionQuestion,
+    QuizSessionStudent,
+    UserResponse,
+)
+
+
+class QueryPlanTest(TestCase):
+    """
+    The grading and tally queries are answered from the composite indexes rather than by
+    scanning a table, on a few sessions with every student answering every question.
+    """
+
+    session_count = 4
+    student_count = 20
+    question_count = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        quiz = Quiz.objects.create(title="Indexed Quiz")
+        cls.questions = QuestionMultipleChoice.objects.bulk_create(
+            QuestionMultipleChoice(
+                quiz=quiz,
+                question_text=f"Question {number}",
+                correct_answer="A",
+                incorrect_answer_list=["B", "C", "D"],
+            )
+            for number in range(cls.question_count)
+        )
+        cls.sessions = QuizSession.objects.bulk_create(
+            QuizSession(quiz=quiz, code=f"PLAN{number:02d}") for number in range(cls.session_count)
+        )
+        QuizSessionQuestion.objects.bulk_create(
+            QuizSessionQuestion(quiz_session=session, question=question, skipped=number == 0)
+            for session in cls.sessions
+            for number, question in enumerate(cls.questions)
+        )
+        students = QuizSessionStudent.objects.bulk_create(
+            QuizSessionStudent(quiz_session=session, username=f"student {number}")
+            for session in cls.sessions
+            for number in range(cls.student_count)
+        )
+        UserResponse.objects.bulk_create(
+            UserResponse(
+                quiz_session_id=student.quiz_session_id,
+                student=student,
+                question=question,
+                selected_answer="A" if (student.id + question.id) % 3 else "B",
+                is_correct=bool((student.id + question.id) % 3),
+            )
+            for student in students
+            for question in cls.questions
+        )
+        cls.session = cls.sessions[0]
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # The seeded tables are small enough that a sequential scan would win.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            else:
+                cursor.execute("ANALYZE")
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+    def explain_queryset(self, queryset):
+        return self.explain(*queryset.query.sql_with_params())
+
+    def assertUsesIndex(self, plan, index_name):
+        self.assertIn(index_name, plan, f"{index_name} is not used by:\n{plan}")
+
+    def test_graded_questions_use_the_skipped_index(self):
+        graded = QuizSessionQuestion.objects.filter(
+            quiz_session_id=self.session.id, skipped=False
+        ).values("question_id")
+        self.assertUsesIndex(self.explain_queryset(graded), "session_question_skipped_idx")
+
+    def test_scoring_counts_correct_answers_from_the_partial_index(self):
+        students = QuizSessionStudent.objects.filter(quiz_session_id=self.session.id).annotate(
+            expected=services._correct_answer_count(self.session.id)
+        )
+        plan = self.explain_queryset(students.values_list("id", "expected"))
+        self.assertUsesIndex(plan, "response_correct_idx")
+        self.assertUsesIndex(plan, "session_question_skipped_idx")
+
+    def test_score_session_statement_uses_the_partial_index(self):
+        if not services._supports_update_from():
+            self.skipTest("UPDATE ... FROM is not supported")
+        sql = services._SCORE_SESSION_SQL.format(
+            student=QuizSessionStudent._meta.db_table,
+            response=UserResponse._meta.db_table,
+            session_question=QuizSessionQuestion._meta.db_table,
+        )
+        plan = self.explain(sql, [self.session.id, self.session.id])
+        self.assertUsesIndex(plan, "response_correct_idx")
+
+    def test_answers_to_a_question_use_the_unique_constraint_index(self):
+        answers = UserResponse.objects.filter(
+            quiz_session_id=self.session.id, question_id=self.questions[1].id
+        ).values_list("student_id", "selected_answer")
+        # SQLite builds unique constraints into the table, under an automatic index name.
+        index_name = (
+            "sqlite_autoindex_api_user_response"
+            if connection.vendor == "sqlite"
+            else "unique_user_response"
+        )
+        self.assertUsesIndex(self.explain_queryset(answers), index_name)
+
+    def test_grade_distribution_uses_the_score_index(self):
+        graded = QuizSessionStudent.objects.filter(
+            quiz_session_id=self.session.id, score__gte=0
+        ).values_list("score", flat=True)
+        self.assertUsesIndex(self.explain_queryset(graded), "session_student_score_idx")
+
+    def test_results_export_reads_answers_from_the_covering_index(self):
+        answers = (
+            UserResponse.objects.filter(quiz_session_id=self.session.id)
+            .order_by("student_id", "id")
+            .values_list("student_id", "question_id", "selected_answer", "is_correct")
+        )
+        self.assertUsesIndex(self.explain_queryset(answers), "response_session_rows_idx")
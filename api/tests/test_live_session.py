@@ -0,0 +1,340 @@
+import json
+import os
+import unittest
+
+from api import live_session as live_session_module
+from api.live_session import (
+    LiveSession,
+    RedisStateStore,
+    get_live_session,
+    get_state_store,
+    invalidate_live_session,
+    peek_live_session,
+)
+from api.models import (
+    AnswerFact,
+    QuestionMultipleChoice,
+    Quiz,
+    QuizSession,
+    QuizSessionQuestion,
+    QuizSessionStudent,
+    UserResponse,
+)
+
+from .test_services import BaseQuizTest
+
+
+class LiveSessionTest(BaseQuizTest):
+    def test_state_is_loaded_once_and_shared(self):
+        live_session = get_live_session(self.code)
+        self.assertIs(get_live_session(self.code), live_session)
+        self.assertEqual(live_session.session_id, self.session.id)
+        self.assertEqual(len(live_session.questions), self.question_count)
+
+    def test_hot_path_reads_do_not_query(self):
+        live_session = get_live_session(self.code)
+        live_session.advance()
+        student = live_session.add_student("student_0")
+
+        with self.assertNumQueries(0):
+            get_live_session(self.code)
+            live_session.to_json()
+            live_session.current_question()
+            live_session.is_question_open(self.question_records[0].id)
+            live_session.has_student(student.id)
+            self.assertEqual(live_session.user_count, 1)
+
+    def test_advance_writes_through(self):
+        live_session = get_live_session(self.code)
+        for question in self.question_records:
+            self.assertEqual(live_session.advance()["id"], question.id)
+        self.assertIsNone(live_session.advance())
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_question_id, self.question_records[-1].id)
+        self.assertEqual(
+            QuizSessionQuestion.objects.filter(quiz_session=self.session).count(),
+            self.question_count,
+        )
+
+    def test_timing_changes_write_through(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+        self.assertTrue(live_session.is_question_open(question_id))
+
+        live_session.extend_question(question_id, 5)
+        live_session.skip_question(question_id)
+        self.assertFalse(live_session.is_question_open(question_id))
+
+        row = QuizSessionQuestion.objects.get(quiz_session=self.session, question_id=question_id)
+        self.assertEqual(row.extension, 5)
+        self.assertTrue(row.skipped)
+        self.assertFalse(row.unlocked)
+
+    def test_roster_reads_through_for_students_created_elsewhere(self):
+        live_session = get_live_session(self.code)
+        student = QuizSessionStudent.objects.create(username="late", quiz_session=self.session)
+        self.assertTrue(live_session.has_student(student.id))
+        self.assertFalse(live_session.has_student(student.id + 100))
+
+    def test_end_and_invalidate(self):
+        live_session = get_live_session(self.code)
+        live_session.end()
+        invalidate_live_session(self.code)
+
+        self.assertIsNone(peek_live_session(self.code))
+        self.assertIsNotNone(QuizSession.objects.get(id=self.session.id).end_time)
+
+    def test_invalidate_writes_queued_answers_first(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+        student = live_session.add_student("student_0")
+        live_session.buffer_response(student.id, question_id, "Paris", True)
+
+        invalidate_live_session(self.code)
+        self.assertIsNone(peek_live_session(self.code))
+        self.assertEqual(
+            list(UserResponse.objects.values_list("student_id", "selected_answer")),
+            [(student.id, "Paris")],
+        )
+
+    def test_answers_to_questions_of_another_quiz_are_skipped_on_load(self):
+        student = QuizSessionStudent.objects.create(username="student_0", quiz_session=self.session)
+        stray = QuestionMultipleChoice.objects.create(
+            question_text="Stray",
+            correct_answer="A",
+            incorrect_answer_list=["B"],
+            quiz=Quiz.objects.create(title="Other Quiz"),
+        )
+        UserResponse.objects.create(
+            quiz_session=self.session, student=student, question=stray, selected_answer="A"
+        )
+
+        live_session = get_live_session(self.code)
+        self.assertEqual(len(live_session.questions), self.question_count)
+
+    def test_second_worker_loads_from_the_store(self):
+        get_live_session(self.code).advance()
+
+        # Simulate another worker: no local handle, but the shared store is populated.
+        live_session_module._live_sessions.clear()
+        with self.assertNumQueries(0):
+            live_session = get_live_session(self.code)
+            self.assertEqual(live_session.current_question()["id"], self.question_records[0].id)
+
+    def test_handles_are_dropped_after_another_worker_invalidates(self):
+        get_live_session(self.code)
+        other = QuizSession.objects.create(code="OTHER1", quiz=self.quiz)
+        get_live_session(other.code)
+
+        # Another worker ends both sessions: only the shared store changes.
+        store = get_state_store()
+        for code in (self.code, other.code):
+            store.delete(*[f"live_session:{code}:{name}" for name in LiveSession.KEYS])
+
+        self.assertIsNone(peek_live_session(other.code))
+        self.assertNotIn(other.code, live_session_module._live_sessions)
+        self.assertFalse(store.exists(f"live_session:{other.code}:meta"))
+
+        # Loading a session sweeps the handles this process would otherwise keep.
+        third = QuizSession.objects.create(code="OTHER2", quiz=self.quiz)
+        get_live_session(third.code)
+        self.assertEqual(list(live_session_module._live_sessions), [third.code])
+
+    def test_workers_never_serve_the_same_question_twice(self):
+        first = get_live_session(self.code)
+        second = LiveSession(self.code, get_state_store())
+
+        served = [first.advance()["id"], second.advance()["id"], first.advance()["id"]]
+        self.assertEqual(served, [q.id for q in self.question_records])
+        self.assertIsNone(second.advance())
+
+    def test_question_colors_are_shared_with_rest_views(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+
+        live_session.set_question_colors(question_id, ["Paris", "London"])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.question_colors, {str(question_id): ["Paris", "London"]})
+
+        response = self.client.get(f"/quiz/student/question/{self.code}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["order"], ["Paris", "London"])
+        self.assertEqual(response.json()["question"]["id"], question_id)
+
+    def test_student_question_is_only_served_for_running_sessions(self):
+        self.session.end_time = self.session.start_time
+        self.session.save()
+
+        for code in (self.code, "NOPE1"):
+            response = self.client.get(f"/quiz/student/question/{code}/")
+            self.assertEqual(response.status_code, 404)
+            self.assertIsNone(peek_live_session(code))
+
+    def test_student_question_is_not_served_once_the_live_session_ends(self):
+        get_live_session(self.code).end()
+
+        response = self.client.get(f"/quiz/student/question/{self.code}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_question_colors_are_merged_into_the_database(self):
+        live_session = get_live_session(self.code)
+        first, second = self.question_records[:2]
+        # Stored by another worker after this one loaded the session.
+        QuizSession.objects.filter(id=self.session.id).update(
+            question_colors={str(first.id): ["Paris", "London"]}
+        )
+
+        live_session.set_question_colors(second.id, ["4", "3"])
+        self.session.refresh_from_db()
+        self.assertEqual(
+            self.session.question_colors,
+            {str(first.id): ["Paris", "London"], str(second.id): ["4", "3"]},
+        )
+
+    def test_tallies_follow_changed_answers(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+        first = live_session.add_student("student_0")
+        second = live_session.add_student("student_1")
+
+        with self.assertNumQueries(0):
+            live_session.buffer_response(first.id, question_id, "Paris", True)
+            live_session.buffer_response(second.id, question_id, "London", False)
+            live_session.buffer_response(second.id, question_id, "Paris", True)
+            tally = live_session.tally(question_id)
+
+        self.assertEqual(tally, {"total_responses": 2, "answers": {"Paris": 2}})
+
+        live_session.remove_student(first.id)
+        self.assertEqual(
+            live_session.tally(question_id), {"total_responses": 1, "answers": {"Paris": 1}}
+        )
+
+    def test_answers_are_tracked_by_choice_index(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+        first = live_session.add_student("student_0")
+        second = live_session.add_student("student_1")
+
+        # The choices are sorted: Berlin, London, Madrid, Paris.
+        self.assertEqual(live_session.choice_index(question_id, "Paris"), 3)
+        self.assertEqual(live_session.choice_text(question_id, 1), "London")
+        self.assertIsNone(live_session.choice_text(question_id, 4))
+
+        live_session.buffer_response(first.id, question_id, "Paris", True)
+        live_session.buffer_response(second.id, question_id, "Rome", False)
+        self.assertEqual(
+            live_session.store.hgetall(live_session.key("answers")),
+            {f"{question_id}:{first.id}": "3", f"{question_id}:{second.id}": "-1"},
+        )
+        # An answer that is not among the choices only counts towards the total.
+        self.assertEqual(
+            live_session.tally(question_id), {"total_responses": 2, "answers": {"Paris": 1}}
+        )
+
+        live_session.flush_responses()
+        self.assertEqual(
+            dict(AnswerFact.objects.values_list("student_id", "choice")),
+            {first.id: 3, second.id: QuestionMultipleChoice.NOT_A_CHOICE},
+        )
+
+    def test_student_channels_follow_reconnects(self):
+        live_session = get_live_session(self.code)
+        first = live_session.add_student("student_0")
+        second = live_session.add_student("student_1")
+        live_session.connect_student(first.id, "specific.a")
+        live_session.connect_student(second.id, "specific.b")
+        live_session.connect_student(first.id, "specific.c")
+        self.assertEqual(
+            live_session.student_channels(), {first.id: "specific.c", second.id: "specific.b"}
+        )
+
+        live_session.remove_student(second.id)
+        self.assertEqual(live_session.student_channels(), {first.id: "specific.c"})
+
+    def test_tallies_are_rebuilt_from_saved_responses(self):
+        live_session = get_live_session(self.code)
+        question_id = live_session.advance()["id"]
+        student = live_session.add_student("student_0")
+        live_session.buffer_response(student.id, question_id, "Berlin", False)
+        live_session.flush_responses()
+
+        # Losing the shared state (e.g. a Redis restart) reloads the tallies from the database.
+        get_state_store().flush()
+        live_session = get_live_session(self.code)
+        self.assertEqual(
+            live_session.tally(question_id), {"total_responses": 1, "answers": {"Berlin": 1}}
+        )
+
+    def test_advance_pops_the_question_queue(self):
+        live_session = get_live_session(self.code)
+
+        # One transaction around the two writes; the queue pop itself never touches the database.
+        with self.assertNumQueries(4):
+            live_session.advance()
+
+    def test_queue_resumes_after_reload(self):
+        get_live_session(self.code).advance()
+
+        get_state_store().flush()
+        live_session = get_live_session(self.code)
+        self.assertEqual(live_session.advance()["id"], self.question_records[1].id)
+
+    def test_student_payloads_are_pre_encoded_without_the_answer_key(self):
+        live_session = get_live_session(self.code)
+        question = self.question_records[0]
+
+        payload = live_session.student_question_json(question.id)
+        self.assertIsInstance(payload, str)
+        self.assertNotIn("correct_answer", json.loads(payload))
+        self.assertEqual(
+            json.loads(payload)["choices"],
+            sorted(question.incorrect_answer_list + [question.correct_answer]),
+        )
+
+        bundle = json.loads(live_session.preload_bundle_json())
+        self.assertEqual([q["id"] for q in bundle["questions"]], live_session.question_order)
+
+
+class _FlushableRedisStateStore(RedisStateStore):
+    """RedisStateStore on a database of its own, which the tests may empty."""
+
+    def flush(self):
+        self.client.flushdb()
+
+
+@unittest.skipUnless(os.getenv("REDIS"), "set REDIS to the host of a Redis server")
+class RedisLiveSessionTest(LiveSessionTest):
+    """The live session tests again, on the Redis store used in production."""
+
+    def setUp(self):
+        previous_store = live_session_module._store
+        live_session_module._store = _FlushableRedisStateStore(host=os.environ["REDIS"], db=15)
+        self.addCleanup(setattr, live_session_module, "_store", previous_store)
+        super().setUp()
+        self.store = live_session_module._store
+
+    def test_hswap_returns_the_previous_value(self):
+        self.assertIsNone(self.store.hswap("swap", "field", "1"))
+        self.assertEqual(self.store.hswap("swap", "field", "2"), "1")
+        self.assertEqual(self.store.hswap("swap", "field"), "2")
+        self.assertIsNone(self.store.hget("swap", "field"))
+
+    def test_writes_refresh_the_expiry(self):
+        self.store.hset("expiring", "a", 1)
+        self.assertEqual(self.store.client.ttl("expiring"), self.store.ttl)
+
+        for write in (
+            lambda: self.store.hincrby("expiring", "a"),
+            lambda: self.store.hswap("expiring", "b", "1"),
+        ):
+            self.store.client.expire("expiring", 5)
+            write()
+            self.assertEqual(self.store.client.ttl("expiring"), self.store.ttl)
+
+        self.store.rpush("queue", "a", "b")
+        self.store.set("value", "1")
+        self.assertEqual(self.store.client.ttl("queue"), self.store.ttl)
+        self.assertEqual(self.store.client.ttl("value"), self.store.ttl)
+        self.assertEqual(self.store.lpop("queue", 5), ["a", "b"])
@@ -1,24 +1,37 @@
 import random
+from io import StringIO
+from unittest.mock import patch
 
 import pytest
 from asgiref.sync import sync_to_async
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
 from api.models import (
+    AnswerFact,
+    Instructor,
     QuestionMultipleChoice,
     Quiz,
     QuizSession,
     QuizSessionQuestion,
     QuizSessionStudent,
+    QuizSessionSummary,
     UserResponse,
 )
-from api.services import score_session
+from api.live_session import clear_live_sessions, get_live_session
+from api import codec, services
+from api.services import score_session, write_user_responses
 from typing import List, Set
 
 
 class BaseQuizTest(TestCase):
     def setUp(self, student_count=5):
+        clear_live_sessions()
         self.quiz = Quiz.objects.create(
             title="Sample Quiz",
         )
@@ -246,3 +259,486 @@ class ScoreSessionServiceTest(BaseQuizTest):
         )
         for student in updated_student_records:
             self.assertEqual(student.score, -1)  # score should be the default value of -1
+
+
+class WriteUserResponsesServiceTest(BaseQuizTest):
+    def setUp(self):
+        super().setUp(student_count=3)
+        self.student_records = [
+            QuizSessionStudent.objects.create(username=s["username"], quiz_session=self.session)
+            for s in self.students
+        ]
+
+    def _response(self, student, question, answer):
+        return {
+            "student_id": student.id,
+            "question_id": question.id,
+            "selected_answer": answer,
+            "is_correct": answer == question.correct_answer,
+        }
+
+    def test_batch_is_written_with_a_fixed_number_of_queries(self):
+        question = self.question_records[0]
+        responses = [self._response(s, question, "Paris") for s in self.student_records]
+
+        # roster and scored questions lookups, one INSERT ... ON CONFLICT for the responses,
+        # then the choices lookup and one for the answer facts (wrapped in a savepoint under
+        # TestCase); no question was served, so no answers are read back
+        with self.assertNumQueries(7):
+            question_ids = write_user_responses(self.session.id, responses)
+
+        self.assertEqual(question_ids, {question.id})
+        self.assertEqual(
+            UserResponse.objects.filter(quiz_session=self.session, is_correct=True).count(), 3
+        )
+
+    def test_later_answers_replace_earlier_ones(self):
+        question = self.question_records[0]
+        student = self.student_records[0]
+        write_user_responses(self.session.id, [self._response(student, question, "Paris")])
+        write_user_responses(
+            self.session.id,
+            [
+                self._response(student, question, "London"),
+                self._response(student, question, "Berlin"),
+            ],
+        )
+
+        response = UserResponse.objects.get(quiz_session=self.session, student=student)
+        self.assertEqual(response.selected_answer, "Berlin")
+        self.assertFalse(response.is_correct)
+        fact = AnswerFact.objects.get(quiz_session=self.session, student=student)
+        self.assertEqual((fact.choice, fact.is_correct), (0, False))
+
+    def test_answer_facts_index_the_choices(self):
+        paris, four, _ = self.question_records
+        student = self.student_records[0]
+        write_user_responses(
+            self.session.id,
+            [self._response(student, paris, "Paris"), self._response(student, four, "Seven")],
+        )
+
+        facts = AnswerFact.objects.filter(quiz_session=self.session).order_by("question_id")
+        self.assertEqual(
+            list(facts.values_list("question_id", "choice", "is_correct")),
+            [(paris.id, 3, True), (four.id, QuestionMultipleChoice.NOT_A_CHOICE, False)],
+        )
+
+    def test_answer_facts_of_questions_written_in_bulk(self):
+        created, edited = QuestionMultipleChoice.objects.bulk_create(
+            QuestionMultipleChoice(
+                quiz=self.quiz, question_text=text, correct_answer="B", incorrect_answer_list=["A"]
+            )
+            for text in ("Created", "Edited")
+        )
+        # bulk_create() and update() bypass save(), which records the choices.
+        QuestionMultipleChoice.objects.filter(id=edited.id).update(incorrect_answer_list=["C"])
+        edited.refresh_from_db()
+        student = self.student_records[0]
+        write_user_responses(
+            self.session.id,
+            [self._response(student, created, "A"), self._response(student, edited, "C")],
+        )
+
+        facts = AnswerFact.objects.filter(quiz_session=self.session).order_by("question_id")
+        self.assertEqual(list(facts.values_list("choice", flat=True)), [0, 1])
+        self.assertEqual(
+            list(
+                QuestionMultipleChoice.objects.filter(id__in=[created.id, edited.id])
+                .order_by("id")
+                .values_list("choice_history", flat=True)
+            ),
+            [["A", "B"], ["B", "C"]],
+        )
+
+    def test_backfill_command(self):
+        student = self.student_records[0]
+        for question in self.question_records:
+            UserResponse.objects.create(
+                student=student,
+                question=question,
+                quiz_session=self.session,
+                selected_answer=question.incorrect_answer_list[0],
+                is_correct=False,
+            )
+
+        out = StringIO()
+        call_command("backfill_answer_facts", stdout=out)
+        self.assertIn("1 sessions backfilled", out.getvalue())
+        # London, 3 and Red in the sorted choices of each question.
+        self.assertEqual(
+            list(AnswerFact.objects.order_by("question_id").values_list("choice", flat=True)),
+            [1, 0, 2],
+        )
+
+        out = StringIO()
+        call_command("backfill_answer_facts", stdout=out)
+        self.assertIn("0 sessions backfilled", out.getvalue())
+
+    def test_answers_of_removed_students_are_dropped(self):
+        question = self.question_records[0]
+        student = self.student_records[0]
+        responses = [self._response(student, question, "Paris")]
+        student.delete()
+
+        write_user_responses(self.session.id, responses)
+        self.assertFalse(UserResponse.objects.filter(quiz_session=self.session).exists())
+
+
+class IncrementalScoreTest(BaseQuizTest):
+    def setUp(self):
+        super().setUp(student_count=3)
+        self.student_records = [
+            QuizSessionStudent.objects.create(username=s["username"], quiz_session=self.session)
+            for s in self.students
+        ]
+        for question in self.question_records:
+            QuizSessionQuestion.objects.create(question=question, quiz_session=self.session)
+
+    _response = WriteUserResponsesServiceTest._response
+
+    def _scores(self):
+        return [
+            QuizSessionStudent.objects.get(id=student.id).score for student in self.student_records
+        ]
+
+    def test_scores_follow_written_answers(self):
+        paris, four, _ = self.question_records
+        first, second, _ = self.student_records
+        write_user_responses(
+            self.session.id,
+            [
+                self._response(first, paris, "Paris"),
+                self._response(first, four, "4"),
+                self._response(second, paris, "London"),
+            ],
+        )
+        # Students keep the ungraded -1 default until they answer a graded question, even
+        # when the answer is wrong.
+        self.assertEqual(self._scores(), [2, 0, -1])
+
+        write_user_responses(
+            self.session.id,
+            [self._response(first, four, "5"), self._response(second, paris, "Paris")],
+        )
+        self.assertEqual(self._scores(), [1, 1, -1])
+        self.assertEqual(
+            self._scores()[:2],
+            [score_session(self.session.id)[s.id] for s in self.student_records[:2]],
+        )
+
+    def test_skipping_a_question_takes_its_answers_out(self):
+        paris, four, _ = self.question_records
+        write_user_responses(
+            self.session.id,
+            [self._response(student, paris, "Paris") for student in self.student_records]
+            + [self._response(self.student_records[0], four, "4")],
+        )
+
+        services.unscore_question(self.session.id, paris.id)
+        QuizSessionQuestion.objects.filter(question=paris).update(skipped=True)
+        self.assertEqual(self._scores(), [1, 0, 0])
+        self.assertEqual(
+            services.expected_scores(self.session.id),
+            dict(zip([s.id for s in self.student_records], self._scores())),
+        )
+
+        # Answers to a skipped question arriving later do not count.
+        write_user_responses(
+            self.session.id, [self._response(self.student_records[1], paris, "Paris")]
+        )
+        self.assertEqual(self._scores(), [1, 0, 0])
+
+    def test_live_session_skip_adjusts_scores_once(self):
+        live_session = get_live_session(self.code)
+        paris = self.question_records[0]
+        write_user_responses(
+            self.session.id, [self._response(self.student_records[0], paris, "Paris")]
+        )
+
+        live_session.skip_question(paris.id)
+        live_session.skip_question(paris.id)
+        self.assertEqual(self._scores(), [0, -1, -1])
+
+
+class ScoreSessionStatementTest(BaseQuizTest):
+    def setUp(self):
+        super().setUp(student_count=4)
+        self.student_records = [
+            QuizSessionStudent.objects.create(username=s["username"], quiz_session=self.session)
+            for s in self.students
+        ]
+        for question in self.question_records:
+            QuizSessionQuestion.objects.create(question=question, quiz_session=self.session)
+        for i, student in enumerate(self.student_records):
+            for question in self.question_records[:i]:
+                UserResponse.objects.create(
+                    student=student,
+                    question=question,
+                    quiz_session=self.session,
+                    selected_answer=question.correct_answer,
+                    is_correct=True,
+                )
+        self.expected = {
+            student.id: min(i, self.question_count)
+            for i, student in enumerate(self.student_records)
+        }
+
+    def test_scores_are_written_in_one_statement(self):
+        # One existence check for served questions, then the UPDATE ... FROM itself.
+        with self.assertNumQueries(2):
+            scores = score_session(self.session.id)
+        self.assertEqual(scores, self.expected)
+
+    def test_update_from_statement(self):
+        self.assertTrue(services._supports_update_from())
+        self.assertEqual(services._score_session_update_from(self.session.id), self.expected)
+
+    def test_subquery_fallback_matches(self):
+        self.assertEqual(services._score_session_subquery(self.session.id), self.expected)
+        self.assertEqual(
+            dict(
+                QuizSessionStudent.objects.filter(quiz_session=self.session).values_list(
+                    "id", "score"
+                )
+            ),
+            self.expected,
+        )
+
+    def test_grading_is_idempotent(self):
+        score_session(self.session.id)
+        self.assertEqual(score_session(self.session.id), self.expected)
+
+    def test_reconcile_command_reports_and_fixes_drift(self):
+        QuizSessionStudent.objects.update(score=-1)
+        out = StringIO()
+        call_command("reconcile_scores", session=[self.session.id], stdout=out)
+        self.assertIn("3 student(s) drifted", out.getvalue())
+        self.assertFalse(QuizSessionStudent.objects.filter(score__gt=0).exists())
+
+        call_command("reconcile_scores", fix=True, stdout=StringIO())
+        out = StringIO()
+        call_command("reconcile_scores", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "0 session(s) with drifted scores")
+
+
+class GradeDistributionTest(ScoreSessionStatementTest):
+    def setUp(self):
+        super().setUp()
+        score_session(self.session.id)
+
+    def test_exact_percentages(self):
+        with self.assertNumQueries(3):
+            distribution = services.grade_distribution(self.session.id)
+
+        self.assertEqual(
+            [(b["percentage"], b["count"]) for b in distribution["buckets"]],
+            [(0.0, 1), (33.33, 1), (66.67, 1), (100.0, 1)],
+        )
+        self.assertEqual(distribution["buckets"][0]["usernames"], ["student_0"])
+        self.assertEqual(
+            distribution["statistics"],
+            {
+                "mean": 50.0,
+                "median": 50.0,
+                "stdev": 37.27,
+                "q1": 25.0,
+                "q3": 75.0,
+                "min": 0.0,
+                "max": 100.0,
+            },
+        )
+
+    def test_bins_and_truncated_usernames(self):
+        distribution = services.grade_distribution(
+            self.session.id, bin_width=50, usernames_limit=1, usernames_offset=1
+        )
+        self.assertEqual(
+            [(b["percentage"], b["count"], b["usernames"]) for b in distribution["buckets"]],
+            [(0.0, 2, ["student_1"]), (50.0, 1, []), (100.0, 1, [])],
+        )
+
+    def test_endpoint(self):
+        user = User.objects.create_user(username="owner", password="password")
+        self.quiz.instructor = Instructor.objects.create(user=user)
+        self.quiz.save()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.get(
+            f"/quiz-session-results/{self.code}/grade-distribution/?bin_width=25&usernames=false"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["student_count"], 4)
+        self.assertNotIn("usernames", response.json()["buckets"][0])
+
+
+class ResultsExportTest(ScoreSessionStatementTest):
+    def setUp(self):
+        super().setUp()
+        # A changed answer.
+        UserResponse.objects.filter(
+            student=self.student_records[3], question=self.question_records[2]
+        ).update(selected_answer="Red", is_correct=False)
+        self.expected[self.student_records[3].id] = 2
+        self.user = User.objects.create_user(username="owner", password="password")
+        self.quiz.instructor = Instructor.objects.create(user=self.user)
+        self.quiz.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_results_are_merged_per_student(self):
+        # Two cursors, over students and responses, whatever the number of students.
+        with self.assertNumQueries(2):
+            results = list(services.iter_session_results(self.session.id, chunk_size=2))
+
+        self.assertEqual(
+            [(r["username"], r["correct"], r["answered"]) for r in results],
+            [("student_0", 0, 0), ("student_1", 1, 1), ("student_2", 2, 2), ("student_3", 2, 3)],
+        )
+        paris, four, blue = self.question_records
+        self.assertEqual(results[3]["answers"], {paris.id: "Paris", four.id: "4", blue.id: "Red"})
+
+    def test_csv_export(self):
+        response = self.client.get(f"/quiz-session-results/{self.code}/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Disposition"], f'attachment; filename="results-{self.code}.csv"'
+        )
+
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        ids = [question.id for question in self.question_records]
+        self.assertEqual(
+            rows[0], "username,correct,answered," + ",".join(f"question_{id}" for id in ids)
+        )
+        self.assertEqual(rows[1], "student_0,0,0,,,")
+        self.assertEqual(rows[4], "student_3,2,3,Paris,4,Red")
+
+    def test_jsonl_export(self):
+        response = self.client.get(f"/quiz-session-results/{self.code}/export/?export_format=jsonl")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            codec.loads(lines[2]),
+            {
+                "username": "student_2",
+                "correct": 2,
+                "answered": 2,
+                "answers": {
+                    str(self.question_records[0].id): "Paris",
+                    str(self.question_records[1].id): "4",
+                },
+            },
+        )
+
+    async def test_export_streams_under_asgi(self):
+        token = await sync_to_async(Token.objects.create)(user=self.user)
+        with patch("api.views.session_views.EXPORT_BATCH_LINES", 2):
+            response = await self.async_client.get(
+                f"/quiz-session-results/{self.code}/export/",
+                headers={"Authorization": f"Token {token.key}"},
+            )
+            # An async iterator, sent as it is produced rather than collected first.
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(len(chunks), 3)
+        rows = b"".join(chunks).decode().splitlines()
+        self.assertEqual(rows[4], "student_3,2,3,Paris,4,Red")
+
+    def test_results_stay_reachable_by_id_after_the_code_is_recycled(self):
+        QuizSession.objects.filter(id=self.session.id).update(code=None)
+        self.assertEqual(
+            self.client.get(f"/quiz-session-results/{self.code}/").status_code,
+            403,
+        )
+
+        prefix = f"/sessions/{self.session.id}/results"
+        results = self.client.get(f"{prefix}/").json()["results"]
+        self.assertEqual(len(results), 4)
+        export = self.client.get(f"{prefix}/export/")
+        self.assertEqual(
+            export["Content-Disposition"], f'attachment; filename="results-{self.session.id}.csv"'
+        )
+        self.assertEqual(len(b"".join(export.streaming_content).decode().splitlines()), 5)
+        self.assertEqual(self.client.get(f"{prefix}/grade-distribution/").status_code, 200)
+
+        other_user = User.objects.create_user(username="other", password="password")
+        self.client.force_authenticate(other_user)
+        self.assertEqual(self.client.get(f"{prefix}/").status_code, 403)
+
+    def test_question_columns_follow_the_serving_order(self):
+        QuizSessionQuestion.objects.filter(quiz_session=self.session).delete()
+        served = list(reversed(self.question_records))
+        for question in served:
+            QuizSessionQuestion.objects.create(quiz_session=self.session, question=question)
+
+        self.assertEqual(
+            services.session_question_ids(self.session.id), [question.id for question in served]
+        )
+
+    def test_unknown_format(self):
+        response = self.client.get(f"/quiz-session-results/{self.code}/export/?export_format=xlsx")
+        self.assertEqual(response.status_code, 400)
+
+
+class SessionSummaryTest(ScoreSessionStatementTest):
+    def setUp(self):
+        super().setUp()
+        score_session(self.session.id)
+
+    def test_summary(self):
+        QuizSessionQuestion.objects.filter(question=self.question_records[2]).update(skipped=True)
+        summary = services.summarize_session(self.session.id)
+        self.assertEqual(
+            summary.to_json(),
+            {
+                "participant_count": 4,
+                "response_count": 6,
+                "mean_score": 1.5,
+                "question_count": 3,
+                "skipped_count": 1,
+            },
+        )
+        # Summarizing again rewrites the same row.
+        services.summarize_session(self.session.id)
+        self.assertEqual(QuizSessionSummary.objects.count(), 1)
+
+    def test_backfill_command(self):
+        QuizSession.objects.create(code="TEST01", quiz=self.quiz)  # still running
+        self.session.end_time = timezone.now()
+        self.session.save()
+
+        out = StringIO()
+        call_command("backfill_session_summaries", stdout=out)
+        self.assertIn("1 session summaries written", out.getvalue())
+        self.assertEqual(
+            list(QuizSessionSummary.objects.values_list("quiz_session_id", flat=True)),
+            [self.session.id],
+        )
+
+        call_command("backfill_session_summaries", stdout=out)
+        self.assertIn("0 session summaries written", out.getvalue())
+
+    def test_session_listing_reads_summaries(self):
+        user = User.objects.create_user(username="owner", password="password")
+        self.quiz.instructor = Instructor.objects.create(user=user)
+        self.quiz.save()
+        services.summarize_session(self.session.id)
+        # Students joining after grading do not change the recorded count.
+        QuizSessionStudent.objects.create(username="after", quiz_session=self.session)
+        running = QuizSession.objects.create(code="TEST01", quiz=self.quiz)
+        QuizSessionStudent.objects.create(username="late", quiz_session=running)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        # Three for the permission check, the quiz, then the page of sessions.
+        with self.assertNumQueries(5):
+            response = client.get(f"/quiz/{self.quiz.id}/sessions")
+        sessions = response.json()["quiz_sessions"]
+        self.assertEqual([s["num_of_participants"] for s in sessions], [4, 1])
+        self.assertEqual(sessions[0]["summary"]["mean_score"], 1.5)
+        self.assertIsNone(sessions[1]["summary"])
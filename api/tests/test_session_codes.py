@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import Quiz, QuizSession, SessionCodeCounter
+from api.session_codes import (
+    CODE_SPACE,
+    code_at,
+    create_quiz_session,
+    permute,
+    release_stale_code,
+)
+
+
+class SessionCodeTest(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title="Sample Quiz")
+
+    def set_position(self, position):
+        SessionCodeCounter.objects.filter(id=1).update(position=position)
+
+    def test_permutation_stays_in_the_code_space_without_repeats(self):
+        values = [permute(position) for position in range(20000)]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= value < CODE_SPACE for value in values))
+
+    def test_codes_use_the_unambiguous_alphabet(self):
+        codes = {code_at(position) for position in range(1000)}
+        self.assertEqual(len(codes), 1000)
+        for code in codes:
+            self.assertEqual(len(code), 5)
+            self.assertFalse(set(code) & {"I", "O", "0"})
+
+    def test_session_is_created_with_its_code_in_one_insert(self):
+        # The counter, then the insert inside a savepoint; no probes and no second save.
+        with self.assertNumQueries(4):
+            session = create_quiz_session(quiz=self.quiz)
+
+        self.assertEqual(session.code, code_at(0))
+        self.assertEqual(QuizSession.objects.get(id=session.id).code, code_at(0))
+        self.assertEqual(create_quiz_session(quiz=self.quiz).code, code_at(1))
+
+    def test_codes_still_in_use_are_skipped(self):
+        QuizSession.objects.create(quiz=self.quiz, code=code_at(0))
+
+        self.assertEqual(create_quiz_session(quiz=self.quiz).code, code_at(1))
+        self.assertEqual(SessionCodeCounter.objects.get(id=1).position, 2)
+
+    def test_counter_is_recreated_after_a_flush(self):
+        SessionCodeCounter.objects.all().delete()
+        self.assertEqual(create_quiz_session(quiz=self.quiz).code, code_at(0))
+
+    @override_settings(SESSION_CODE_RETENTION_DAYS=30)
+    def test_codes_are_recycled_after_the_retention_window(self):
+        long_ago = timezone.now() - timedelta(days=31)
+        ended = QuizSession.objects.create(
+            quiz=self.quiz, code=code_at(0), start_time=long_ago, end_time=long_ago
+        )
+        abandoned = QuizSession.objects.create(quiz=self.quiz, code=code_at(1), start_time=long_ago)
+        recent = QuizSession.objects.create(
+            quiz=self.quiz, code=code_at(2), start_time=long_ago, end_time=timezone.now()
+        )
+
+        self.set_position(CODE_SPACE)
+        codes = [create_quiz_session(quiz=self.quiz).code for _ in range(3)]
+
+        self.assertEqual(codes, [code_at(0), code_at(1), code_at(3)])
+        ended.refresh_from_db()
+        abandoned.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertIsNone(ended.code)
+        self.assertIsNone(abandoned.code)
+        self.assertEqual(recent.code, code_at(2))
+
+    def test_codes_are_not_recycled_before_the_counter_wraps(self):
+        long_ago = timezone.now() - timedelta(days=365)
+        QuizSession.objects.create(
+            quiz=self.quiz, code=code_at(0), start_time=long_ago, end_time=long_ago
+        )
+
+        self.assertEqual(create_quiz_session(quiz=self.quiz).code, code_at(1))
+        self.assertEqual(release_stale_code(code_at(1)), 0)
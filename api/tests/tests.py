@@ -7,6 +7,7 @@ from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 from api.models import *
+from api.serializers import SessionPageQuerySerializer
 
 # Create your tests here.
 
@@ -351,6 +352,122 @@ class UserResponseViewTest(BaseTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response_data["is_correct"], False)
         self.assertEqual(response_data["message"], "User response updated successfully")
+        fact = AnswerFact.objects.get(student=self.new_quiz_session_student)
+        self.assertEqual((fact.choice, fact.is_correct), (1, False))
+
+    def test_post_user_response_replaces_the_previous_answer(self):
+        url = reverse("user-response-list")
+        data = {
+            "student": {"id": self.new_quiz_session_student.id},
+            "question_id": self.new_question.id,
+            "quiz_session_code": self.new_quiz_session.code,
+        }
+        first = self.client.post(url, {**data, "selected_answer": "3"}, format="json").json()
+        second = self.client.post(url, {**data, "selected_answer": "2"}, format="json").json()
+
+        self.assertEqual(first["response_id"], self.new_user_response.id)
+        self.assertEqual(second["response_id"], self.new_user_response.id)
+        self.assertTrue(second["is_correct"])
+        response = UserResponse.objects.get(
+            quiz_session=self.new_quiz_session, student=self.new_quiz_session_student
+        )
+        self.assertEqual(response.selected_answer, "2")
+
+    def test_post_user_response_to_a_question_of_another_quiz(self):
+        other_question = QuestionMultipleChoice.objects.create(
+            question_text="What is 2 + 2?",
+            incorrect_answer_list=["3", "5"],
+            correct_answer="4",
+            quiz=Quiz.objects.create(title="Other Quiz", instructor=self.instructor),
+        )
+        data = {
+            "student": {"id": self.new_quiz_session_student.id},
+            "question_id": other_question.id,
+            "quiz_session_code": self.new_quiz_session.code,
+            "selected_answer": "4",
+        }
+        response = self.client.post(reverse("user-response-list"), data, format="json")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(UserResponse.objects.filter(question=other_question).exists())
+
+    def test_post_user_response_by_choice_index(self):
+        url = reverse("user-response-list")
+        data = {
+            "student": {"id": self.new_quiz_session_student.id},
+            "question_id": self.new_question.id,
+            "quiz_session_code": self.new_quiz_session.code,
+        }
+        # The choices are sorted: 0, 1, 2, 3.
+        response = self.client.post(url, {**data, "choice": 2}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["choice"], 2)
+        self.assertTrue(response.json()["is_correct"])
+        self.assertEqual(
+            UserResponse.objects.get(id=response.json()["response_id"]).selected_answer, "2"
+        )
+
+        response = self.client.post(url, {**data, "choice": 4}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_response_counts_of_the_current_question(self):
+        self.new_quiz_session.current_question = self.new_question
+        self.new_quiz_session.save()
+        other_student = QuizSessionStudent.objects.create(
+            quiz_session=self.new_quiz_session, username="other"
+        )
+        url = reverse("user-response-list")
+        for student, answer in ((self.new_quiz_session_student, "3"), (other_student, "3")):
+            self.client.post(
+                url,
+                {
+                    "student": {"id": student.id},
+                    "question_id": self.new_question.id,
+                    "quiz_session_code": self.new_quiz_session.code,
+                    "selected_answer": answer,
+                },
+                format="json",
+            )
+
+        response = self.client_instructor.get(
+            reverse("quiz-session-responses", kwargs={"code": self.new_quiz_session.code})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"3": 2})
+
+    def test_response_counts_survive_editing_the_choices(self):
+        self.new_quiz_session.current_question = self.new_question
+        self.new_quiz_session.save()
+        self.client.post(
+            reverse("user-response-list"),
+            {
+                "student": {"id": self.new_quiz_session_student.id},
+                "question_id": self.new_question.id,
+                "quiz_session_code": self.new_quiz_session.code,
+                "selected_answer": "3",
+            },
+            format="json",
+        )
+
+        # "3" is no longer a choice and a new one sorts before every other.
+        self.client_instructor.put(
+            reverse("question-detail", kwargs={"question_id": self.new_question.id}),
+            {
+                "incorrect_answer_list": [
+                    {"answer": "-1", "feedback": ""},
+                    {"answer": "0", "feedback": ""},
+                ]
+            },
+            format="json",
+        )
+        self.new_question.refresh_from_db()
+        self.assertEqual(self.new_question.choice_history, ["0", "1", "2", "3", "-1"])
+
+        response = self.client_instructor.get(
+            reverse("quiz-session-responses", kwargs={"code": self.new_quiz_session.code})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"3": 1})
 
 
 class QuizSessionResultsTest(BaseTest):
@@ -401,6 +518,57 @@ class QuizSessionsByInstructorViewTest(TestCase):
         self.assertIn(self.quiz_session2.code, str(response.content))
         self.assertIn(self.quiz.title, str(response.content))
 
+    def test_session_times_are_encoded_by_the_codec(self):
+        session = self.client.get(reverse("quiz-sessions-list")).json()["quiz_sessions"][0]
+
+        self.assertEqual(session["start_time"], self.quiz_session1.start_time.isoformat())
+        self.assertIsNone(session["end_time"])
+
+    def test_sessions_are_not_paged_without_a_limit_or_cursor(self):
+        other_quiz = Quiz.objects.create(title="Other Quiz", instructor=self.instructor)
+        start = self.quiz_session1.start_time
+        for i in range(SessionPageQuerySerializer.DEFAULT_LIMIT):
+            QuizSession.objects.create(
+                quiz=other_quiz, code=f"ALL{i}", start_time=start - timedelta(minutes=i + 1)
+            )
+
+        page = self.client.get(reverse("quiz-sessions-list")).json()
+
+        sessions = page["quiz_sessions"]
+        self.assertEqual(len(sessions), SessionPageQuerySerializer.DEFAULT_LIMIT + 2)
+        self.assertIsNone(page["next_cursor"])
+        # Grouped by quiz, then by start time.
+        self.assertEqual([s["code"] for s in sessions[:2]], ["ABC123", "XYZ789"])
+        self.assertEqual(sessions[2]["code"], f"ALL{SessionPageQuerySerializer.DEFAULT_LIMIT - 1}")
+
+    def test_sessions_are_paged_with_a_cursor(self):
+        start = self.quiz_session1.start_time
+        for i in range(3):
+            session = QuizSession.objects.create(
+                quiz=self.quiz, code=f"PAGE{i}", start_time=start + timedelta(minutes=i + 1)
+            )
+            QuizSessionStudent.objects.create(username=f"student_{i}", quiz_session=session)
+        url = reverse("quiz-sessions-list")
+
+        codes, cursor = [], None
+        while True:
+            params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+            # Token and instructor lookups, then one for the page.
+            with self.assertNumQueries(3):
+                page = self.client.get(url, params).json()
+            codes += [session["code"] for session in page["quiz_sessions"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(codes[2:], ["PAGE0", "PAGE1", "PAGE2"])
+        self.assertEqual(len(codes), 5)
+        self.assertEqual(page["quiz_sessions"][-1]["num_of_participants"], 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("quiz-sessions-list"), {"cursor": "nonsense"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class AddQuizSessionLogTest(BaseTest):
     def setUp(self):
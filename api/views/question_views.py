@@ -8,7 +8,7 @@ from api.serializers import (
     QuestionMultipleChoiceSerializer,
 )
 from rest_framework import serializers
-from django.http import JsonResponse
+from api.codec import JsonResponse
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from api.permissions import IsQuestionOwner
@@ -3,6 +3,7 @@ from rest_framework import status
 from rest_framework.response import Response
 import json
 
+from api.analytics import item_analysis
 from api.models import Quiz
 from api.serializers import (
     QuizSerializer,
@@ -12,8 +13,9 @@ from api.serializers import (
     CreateQuizFromTranscriptRequestSerializer,
 )
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from api.codec import JsonResponse
 
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from ..permissions import IsCourseOwner, IsEnrolledInCourse
@@ -106,7 +108,7 @@ class InstructorQuizzesView(APIView):
 
     @extend_schema(responses={200: QuizListSerializer}, summary="Get all quizzes by instructor")
     def get(self, request):
-        quizzes = Quiz.objects.filter(instructor=request.user.instructor)
+        quizzes = Quiz.objects.filter(instructor=request.user.instructor).with_counts()
         return Response(QuizListSerializer({"quizzes": quizzes}).data, status=status.HTTP_200_OK)
 
 
@@ -176,10 +178,28 @@ class QuizzesByCourseView(APIView):
         is_instructor = True if hasattr(request.user, "instructor") else False
         if is_instructor:
             # return all quizes for course
-            quizzes = Quiz.objects.filter(course_id=course_id)
+            quizzes = Quiz.objects.filter(course_id=course_id).with_counts()
         else:
             # Return only published quizzes
-            quizzes = Quiz.objects.filter(published=True, course_id=course_id)
+            quizzes = Quiz.objects.filter(published=True, course_id=course_id).with_counts()
 
         return_response = FetchCourseQuizzesSerializer(quizzes, many=True).data
         return Response(return_response, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Quiz Analytics"])
+class QuizItemAnalysisView(APIView):
+    permission_classes = [IsQuizOwner]
+
+    @extend_schema(
+        operation_id="quiz_item_analysis",
+        summary="Item analysis",
+        description=(
+            "Per-question p-value, point-biserial discrimination and choice selection rates "
+            "across every finished session of the quiz."
+        ),
+        responses={200: OpenApiTypes.OBJECT, 403: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+    )
+    def get(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz, id=quiz_id)
+        return Response(item_analysis(quiz.id), status=status.HTTP_200_OK)
@@ -233,8 +233,10 @@ class GetQuizzesAndSummaries(APIView):
         },
     )
     def get(self, request, recording_id):
-        quizzes = Quiz.objects.filter(instructor_recording_id=recording_id).annotate(
-            type=Value("quiz", output_field=CharField())
+        quizzes = (
+            Quiz.objects.filter(instructor_recording_id=recording_id)
+            .with_counts()
+            .annotate(type=Value("quiz", output_field=CharField()))
         )
         summaries = LectureSummary.objects.filter(recording_id=recording_id).annotate(
             type=Value("summary", output_field=CharField())
@@ -1,11 +1,17 @@
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from api.models import (
     Quiz,
     QuizSession,
     QuizSessionStudent,
-    UserResponse,
     QuestionMultipleChoice,
     InstructorRecordings,
     LectureSummary,
@@ -14,13 +20,25 @@ from django.shortcuts import get_object_or_404
 from rest_framework.permissions import AllowAny
 from rest_framework import status
 
+from api.live_session import (
+    get_live_session,
+    get_live_session_or_404,
+    get_running_live_session_or_404,
+    peek_live_session,
+)
 from api.permissions import IsRecordingOwner
 from api.serializers import (
     QuizSessionStudentSerializer,
     AddQuizSessionLogSerializer,
+    GradeDistributionQuerySerializer,
     LectureSummarySerializer,
+    ResultsExportQuerySerializer,
+    SessionPageQuerySerializer,
 )
-from django.http import JsonResponse
+from api.services import grade_distribution, iter_session_results, session_question_ids
+from api.session_codes import create_quiz_session
+from api import codec
+from api.codec import JsonResponse
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
 
@@ -32,31 +50,33 @@ class StudentResponseCountView(APIView):
     permission_classes = [IsSessionOwner]
 
     def get(self, request, code):
-        quiz_session = get_object_or_404(QuizSession, code=code)
-        responses = quiz_session.responses.filter(question_id=quiz_session.current_question)
-
-        counts = {}
-        for response in responses:
-            # Increment the count for the selected answer or initialize it to 0 if not found
-            counts[response.selected_answer] = counts.get(response.selected_answer, 0) + 1
-
-        return Response(counts, status=200)
+        quiz_session = get_object_or_404(
+            QuizSession.objects.select_related("current_question"), code=code
+        )
+        question = quiz_session.current_question
+        if question is None:
+            return Response({}, status=200)
+
+        # Grouped by the choice id of the answer facts rather than the answer text.
+        choices = question.choice_history
+        counts = (
+            quiz_session.answer_facts.filter(question=question)
+            .exclude(choice=QuestionMultipleChoice.NOT_A_CHOICE)
+            .order_by("choice")
+            .values_list("choice")
+            .annotate(count=Count("id"))
+        )
+        return Response({choices[choice]: count for choice, count in counts}, status=200)
 
 
 @extend_schema(tags=["Session Activities"])
 class StoreColorAPIView(APIView):
     def post(self, request, session_code):
-        session = get_object_or_404(QuizSession, code=session_code)
         question_id = request.data.get("question_id")
         order = request.data.get("order")
 
-        # Ensure that session.question_colors is a dictionary
-
-        # Add the new key-value pair
-        session.question_colors[question_id] = order
-
-        # Save the updated session
-        session.save()
+        live_session = get_live_session_or_404(session_code)
+        live_session.set_question_colors(question_id, order)
 
         return Response({"message": "Colors stored successfully."}, status=200)
 
@@ -69,9 +89,7 @@ class QuizSessionView(APIView):
         try:
             quiz_id = request.data.get("quiz_id")
             quiz = get_object_or_404(Quiz, id=quiz_id)
-            new_quiz_session = QuizSession.objects.create(quiz=quiz)
-            new_quiz_session.code = QuizSession.generate_unique_code(new_quiz_session)
-            new_quiz_session.save()
+            new_quiz_session = create_quiz_session(quiz=quiz)
 
             return Response(
                 {
@@ -105,6 +123,9 @@ class QuizSessionStudentView(APIView):
         new_quiz_session_student = QuizSessionStudent.objects.create(
             **request.data, quiz_session=quiz_session
         )
+        live_session = peek_live_session(code)
+        if live_session is not None:
+            live_session.track_student(new_quiz_session_student)
         return JsonResponse(
             {
                 "message": "Quiz session student created successfully",
@@ -145,54 +166,263 @@ class QuizSessionInstructorView(APIView):
         return Response(quiz_dict, status=200)
 
 
+def _get_session_or_404(code=None, session_id=None) -> QuizSession:
+    """
+    The session named in the URL. Codes are recycled once a session is past the retention
+    window (see api.session_codes), so finished sessions stay reachable by id.
+    """
+    if session_id is not None:
+        return get_object_or_404(QuizSession, id=session_id)
+    return get_object_or_404(QuizSession, code=code)
+
+
 @extend_schema(tags=["Session Activities"])
 class QuizSessionResults(APIView):
     permission_classes = [IsSessionOwner]
 
-    def get(self, request, code):
-        quiz_session = get_object_or_404(QuizSession, code=code)
-        students = QuizSessionStudent.objects.filter(quiz_session=quiz_session)
+    def get(self, request, code=None, session_id=None):
+        quiz_session = _get_session_or_404(code, session_id)
+        students = (
+            QuizSessionStudent.objects.filter(quiz_session=quiz_session)
+            .order_by("id")
+            .values_list("id", "username")
+            .annotate(
+                correct_answers=Count("responses", filter=Q(responses__is_correct=True)),
+                total_questions=Count("responses"),
+            )
+        )
 
-        results = []
-        for student in students:
-            total_questions = UserResponse.objects.filter(student=student).count()
-            correct_answers = UserResponse.objects.filter(student=student, is_correct=True).count()
+        results = [
+            {
+                "student_username": username,
+                "correct_answers": correct_answers,
+                "total_questions": total_questions,
+            }
+            for _, username, correct_answers, total_questions in students
+        ]
 
-            results.append(
-                {
-                    "student_username": student.username,
-                    "correct_answers": correct_answers,
-                    "total_questions": total_questions,
-                }
+        return JsonResponse({"results": results})
+
+
+class _Echo:
+    """File-like object whose write returns the value, so csv.writer can build lines lazily."""
+
+    def write(self, value):
+        return value
+
+
+def _results_csv(question_ids, results):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(
+        ["username", "correct", "answered"] + [f"question_{id}" for id in question_ids]
+    )
+    for result in results:
+        answers = result["answers"]
+        yield writer.writerow(
+            [result["username"], result["correct"], result["answered"]]
+            + [answers.get(id, "") for id in question_ids]
+        )
+
+
+def _results_jsonl(results):
+    for result in results:
+        yield codec.dumps(result) + "\n"
+
+
+# Lines of an export read from the database per hop to the sync thread.
+EXPORT_BATCH_LINES = 500
+
+
+async def _batched_async(lines):
+    """
+    Pull ``lines`` (and the queries behind them) on the sync thread, a batch at a time. Under
+    ASGI, Django collects a sync streaming iterator into a list before sending the first byte;
+    an async one is sent as it is produced.
+    """
+    next_batch = sync_to_async(lambda: "".join(islice(lines, EXPORT_BATCH_LINES)))
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        yield batch
+
+
+@extend_schema(tags=["Session Activities"])
+class QuizSessionResultsExport(APIView):
+    permission_classes = [IsSessionOwner]
+
+    @extend_schema(
+        operation_id="export_session_results",
+        summary="Export session results",
+        description=(
+            "Streams every student's correct and answered counts and their answer to each "
+            "served question, as CSV (one question_<id> column per question) or JSON lines."
+        ),
+        parameters=[ResultsExportQuerySerializer],
+        responses={
+            (200, "text/csv"): OpenApiTypes.STR,
+            (200, "application/x-ndjson"): OpenApiTypes.STR,
+            400: OpenApiTypes.OBJECT,
+        },
+    )
+    def get(self, request, code=None, session_id=None):
+        quiz_session = _get_session_or_404(code, session_id)
+        serializer = ResultsExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = iter_session_results(quiz_session.id)
+        if serializer.validated_data["export_format"] == "jsonl":
+            content, content_type, extension = (
+                _results_jsonl(results),
+                "application/x-ndjson",
+                "jsonl",
+            )
+        else:
+            question_ids = session_question_ids(quiz_session.id)
+            content, content_type, extension = (
+                _results_csv(question_ids, results),
+                "text/csv",
+                "csv",
             )
 
-        return JsonResponse({"results": results})
+        # Only ASGI requests carry a connection scope; Request passes the attribute through
+        # from the underlying HttpRequest.
+        if getattr(request, "scope", None) is not None:
+            content = _batched_async(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="results-{quiz_session.code or quiz_session.id}.{extension}"'
+        )
+        return response
+
+
+@extend_schema(tags=["Session Activities"])
+class QuizSessionGradeDistribution(APIView):
+    permission_classes = [IsSessionOwner]
+
+    @extend_schema(
+        operation_id="grade_distribution",
+        summary="Grade distribution",
+        description="Histogram and summary statistics of the graded scores of a session.",
+        parameters=[GradeDistributionQuerySerializer],
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+    )
+    def get(self, request, code=None, session_id=None):
+        quiz_session = _get_session_or_404(code, session_id)
+        serializer = GradeDistributionQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            distribution = grade_distribution(
+                quiz_session.id,
+                bin_width=serializer.validated_data.get("bin_width"),
+                include_usernames=serializer.validated_data["usernames"],
+                usernames_limit=serializer.validated_data.get("usernames_limit"),
+                usernames_offset=serializer.validated_data["usernames_offset"],
+            )
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        return Response(distribution, status=status.HTTP_200_OK)
+
+
+_SUMMARY_FIELDS = [
+    "participant_count",
+    "response_count",
+    "mean_score",
+    "question_count",
+    "skipped_count",
+]
+
+
+def _session_page(sessions, query_params, ordering):
+    """
+    One page of ``sessions`` in (start_time, id) order, built from a single annotated
+    values() query. Pages continue after the cursor of the previous page's last session,
+    so the query costs the same however many sessions come before it.
+
+    Without a limit or a cursor every session is returned in ``ordering``, as the listings
+    did before they were paged.
+    """
+    serializer = SessionPageQuerySerializer(data=query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    limit = serializer.validated_data.get("limit")
+    cursor = serializer.validated_data.get("cursor")
+
+    if limit is None and cursor is None:
+        sessions = sessions.order_by(*ordering)
+    else:
+        limit = limit or SessionPageQuerySerializer.DEFAULT_LIMIT
+        if cursor is not None:
+            start_time, session_id = cursor
+            sessions = sessions.filter(
+                Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=session_id)
+            )
+        sessions = sessions.order_by("start_time", "id")
+    rows = (
+        sessions.values(
+            "id",
+            "quiz_id",
+            "quiz__title",
+            "start_time",
+            "end_time",
+            "code",
+            "summary__updated_at",
+            *[f"summary__{field}" for field in _SUMMARY_FIELDS],
+        )
+        # Graded sessions keep their participant count in the summary.
+        .annotate(
+            num_of_participants=Coalesce(
+                "summary__participant_count", Count("students", distinct=True)
+            )
+        )
+    )
+    rows = list(rows if limit is None else rows[: limit + 1])
+
+    quiz_sessions_data = [
+        {
+            "quiz_session_id": row["id"],
+            "quiz_id": row["quiz_id"],
+            "quiz_name": row["quiz__title"],
+            "start_time": row["start_time"],
+            "end_time": row["end_time"],
+            "code": row["code"],
+            "num_of_participants": row["num_of_participants"],
+            "summary": (
+                {field: row[f"summary__{field}"] for field in _SUMMARY_FIELDS}
+                if row["summary__updated_at"] is not None
+                else None
+            ),
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = SessionPageQuerySerializer.encode_cursor(last["start_time"], last["id"])
+
+    return JsonResponse({"quiz_sessions": quiz_sessions_data, "next_cursor": next_cursor})
 
 
 @extend_schema(tags=["Session Management"])
 class QuizSessionsByInstructorView(APIView):
     permissions = [AllowInstructor]
 
+    @extend_schema(
+        parameters=[SessionPageQuerySerializer],
+        description=(
+            "Returns the instructor's sessions by quiz and start time. With limit or cursor, "
+            "returns them oldest first a page at a time; pass next_cursor back as cursor for "
+            "the next page."
+        ),
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    )
     def get(self, request):
         instructor = request.user.instructor
-
-        quiz_sessions = QuizSession.objects.filter(quiz__instructor=instructor).order_by(
-            "quiz_id", "start_time"
-        )
-
-        quiz_sessions_data = [
-            {
-                "quiz_session_id": session.id,
-                "quiz_id": session.quiz.id,
-                "quiz_name": session.quiz.title,
-                "start_time": (session.start_time.isoformat() if session.start_time else None),
-                "end_time": session.end_time.isoformat() if session.end_time else None,
-                "code": session.code,
-            }
-            for session in quiz_sessions
-        ]
-
-        return JsonResponse({"quiz_sessions": quiz_sessions_data})
+        sessions = QuizSession.objects.filter(quiz__instructor=instructor)
+        return _session_page(sessions, request.query_params, ordering=("quiz_id", "start_time"))
 
 
 @extend_schema(tags=["Quiz Creation and Modification"])
@@ -201,9 +431,15 @@ class QuizSessionsByQuizView(APIView):
 
     @extend_schema(
         operation_id="quiz-sessions",
-        description="Returns all sessions of the quiz with the specified id",
+        description=(
+            "Returns the sessions of the quiz with the specified id oldest first. With limit "
+            "or cursor, returns them a page at a time; pass next_cursor back as cursor for the "
+            "next page."
+        ),
+        parameters=[SessionPageQuerySerializer],
         responses={
             200: OpenApiTypes.OBJECT,
+            400: OpenApiTypes.OBJECT,
             401: OpenApiTypes.OBJECT,
             404: OpenApiTypes.OBJECT,
             403: OpenApiTypes.OBJECT,
@@ -211,21 +447,8 @@ class QuizSessionsByQuizView(APIView):
     )
     def get(self, request, quiz_id):
         quiz = get_object_or_404(Quiz, id=quiz_id)
-        sessions = QuizSession.objects.filter(quiz=quiz).order_by("start_time")
-        quiz_sessions_data = [
-            {
-                "quiz_session_id": session.id,
-                "quiz_id": session.quiz.id,
-                "quiz_name": session.quiz.title,
-                "start_time": (session.start_time.isoformat() if session.start_time else None),
-                "end_time": (session.start_time.isoformat() if session.end_time else None),
-                "code": session.code,
-                "num_of_participants": session.students.count(),
-            }
-            for session in sessions
-        ]
-
-        return JsonResponse({"quiz_sessions": quiz_sessions_data})
+        sessions = QuizSession.objects.filter(quiz=quiz)
+        return _session_page(sessions, request.query_params, ordering=("start_time", "id"))
 
 
 @extend_schema(tags=["Session Management"])
@@ -265,20 +488,10 @@ class NextQuestionAPIView(APIView):
 
     def get(self, request, code):
         try:
-            session = QuizSession.objects.get(code=code)
-            served_questions_ids = session.served_questions.all().values_list("id", flat=True)
-            next_question = (
-                QuestionMultipleChoice.objects.exclude(id__in=served_questions_ids)
-                .filter(quiz=session.quiz)
-                .first()
-            )
+            next_question = get_live_session(code).advance()
 
             if next_question:
-                # Mark the question as served
-                session.served_questions.add(next_question)
-                session.current_question = next_question
-                session.save()
-                return Response(next_question.to_json(), status=200)
+                return Response(next_question, status=200)
             else:
                 return Response({"message": "No more questions."}, status=204)
         except QuizSession.DoesNotExist:
@@ -290,20 +503,20 @@ class StudentQuestion(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, session_code, question_id=0):
-        session = get_object_or_404(QuizSession, code=session_code)
-        current_question = session.current_question
+        live_session = get_running_live_session_or_404(session_code)
+        current_question = live_session.current_question_id
+        if current_question is not None:
+            current_question = live_session.student_question(current_question)
         if question_id == 0:
             if current_question:
-                order = session.question_colors.get(str(current_question.id))
-                return Response(
-                    {"question": current_question.to_json(), "order": order}, status=200
-                )
+                order = live_session.question_colors.get(str(current_question["id"]))
+                return Response({"question": current_question, "order": order}, status=200)
             else:
                 return Response({"message": "No more questions."}, status=204)
         else:
-            if current_question.id != question_id:
+            if current_question is None or current_question["id"] != question_id:
                 if current_question:
-                    return Response(current_question.to_json(), status=200)
+                    return Response(current_question, status=200)
                 else:
                     return Response({"message": "No more questions."}, status=204)
             else:
@@ -6,7 +6,7 @@ import boto3
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
-from django.http import JsonResponse
+from api.codec import JsonResponse
 from django.shortcuts import get_object_or_404
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
@@ -57,8 +57,15 @@ from api.serializers import (
     GoogleSSOResponseSerializer,
 )
 
+from ..live_session import peek_live_session
 from ..permissions import IsRecordingOwner
-from ..services import score_session
+from ..services import (
+    rescore_response,
+    score_session,
+    summarize_session,
+    write_answer_facts,
+    write_user_responses,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -536,24 +543,55 @@ class UserResponseView(APIView):
 
     def post(self, request):
         student_data = request.data.pop("student", {})
-        student = get_object_or_404(QuizSessionStudent, id=student_data["id"])
-        question = get_object_or_404(QuestionMultipleChoice, id=request.data["question_id"])
-        selected_answer = request.data["selected_answer"]
         quiz_session = get_object_or_404(QuizSession, code=request.data["quiz_session_code"])
+        student = get_object_or_404(
+            QuizSessionStudent, id=student_data["id"], quiz_session=quiz_session
+        )
+        question = get_object_or_404(
+            QuestionMultipleChoice, id=request.data["question_id"], quiz_id=quiz_session.quiz_id
+        )
+        # The answer may be given as its index in the question's choices instead of its text.
+        choices = question.answer_choices()
+        choice = request.data.get("choice")
+        if choice is None:
+            selected_answer = request.data["selected_answer"]
+        elif isinstance(choice, int) and 0 <= choice < len(choices):
+            selected_answer = choices[choice]
+        else:
+            return Response(
+                {"message": "Unknown choice for this question."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+        QuestionMultipleChoice.record_choice_histories([question])
+
+        # Answering again replaces the student's previous answer to the question.
         is_correct = selected_answer == question.correct_answer
-        new_user_response = UserResponse.objects.create(
-            student=student,
-            is_correct=is_correct,
-            quiz_session=quiz_session,
-            question=question,
-            selected_answer=selected_answer,
+        choice = question.choice_index(selected_answer)
+        write_user_responses(
+            quiz_session.id,
+            [
+                {
+                    "student_id": student.id,
+                    "question_id": question.id,
+                    "selected_answer": selected_answer,
+                    "is_correct": is_correct,
+                    "choice_id": question.choice_id(selected_answer),
+                }
+            ],
         )
+        response_id = UserResponse.objects.values_list("id", flat=True).get(
+            quiz_session=quiz_session, student=student, question=question
+        )
+        live_session = peek_live_session(quiz_session.code)
+        if live_session is not None and live_session.session_id == quiz_session.id:
+            live_session.record_answer(student.id, question.id, selected_answer)
         return JsonResponse(
             {
                 "message": "User response created successfully",
-                "response_id": new_user_response.id,
+                "response_id": response_id,
                 "is_correct": is_correct,
+                "choice": choice,
             }
         )
 
@@ -571,10 +609,31 @@ class UserResponseView(APIView):
             UserResponse, id=response_id, student_id=request.data["student_id"]
         )
 
+        was_correct = user_response.is_correct
         is_correct = request.data.get("selected_answer") == user_response.question.correct_answer
         user_response.__dict__.update({"is_correct": is_correct, **request.data})
         user_response.save()
 
+        if user_response.quiz_session is not None:
+            write_answer_facts(user_response.quiz_session_id, [user_response])
+            rescore_response(
+                user_response.quiz_session_id,
+                user_response.student_id,
+                user_response.question_id,
+                was_correct,
+                is_correct,
+            )
+            live_session = peek_live_session(user_response.quiz_session.code)
+            if (
+                live_session is not None
+                and live_session.session_id == user_response.quiz_session_id
+            ):
+                live_session.record_answer(
+                    user_response.student_id,
+                    user_response.question_id,
+                    user_response.selected_answer,
+                )
+
         return JsonResponse(
             {"message": "User response updated successfully", "is_correct": is_correct}
         )
@@ -1035,7 +1094,7 @@ class QuizByRecordingView(APIView):
         instructor_id = current_user.instructor.id
         quizzes = Quiz.objects.filter(
             instructor_recording_id=recording_id, instructor_id=instructor_id
-        )
+        ).with_counts()
 
         if not quizzes.exists():
             return Response([], status=status.HTTP_200_OK)
@@ -1067,6 +1126,7 @@ class UpdateScoresView(APIView):
     )
     def post(self, request, session_id):
         score_session(session_id)
+        summarize_session(session_id)
         return Response({"message": "Quiz scored successfully"}, status=status.HTTP_200_OK)
 
 
@@ -7,13 +7,15 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hice_backend.settings")
 django.setup()
 
 # Now you can safely import your modules that may use Django models
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from api.consumers import GRADING_CHANNEL, GradingConsumer
 from api.routing import websocket_urlpatterns
 
 application = ProtocolTypeRouter(
     {
         "http": get_asgi_application(),
         "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+        "channel": ChannelNameRouter({GRADING_CHANNEL: GradingConsumer.as_asgi()}),
     }
 )
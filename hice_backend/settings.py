@@ -118,6 +118,8 @@ if TESTING or "test" in sys.argv:
             "NAME": ":memory:",  # Use in-memory SQLite database for faster tests
         }
     }
+    # SQLite builds covering indexes without their INCLUDE columns, which is fine for tests.
+    SILENCED_SYSTEM_CHECKS = ["models.W040"]
 else:
     DATABASES = {
         "default": {
@@ -130,6 +132,42 @@ else:
         }
     }
 
+# Live quiz session state shared by every Daphne worker (see api/live_session.py)
+if DEBUG or TESTING:
+    LIVE_SESSION_STORE = {
+        "BACKEND": "api.live_session.InMemoryStateStore",
+    }
+else:
+    LIVE_SESSION_STORE = {
+        "BACKEND": "api.live_session.RedisStateStore",
+        "CONFIG": {
+            "host": os.getenv("REDIS"),
+            "port": 6379,
+        },
+    }
+
+# Student answers are buffered and written in batches, whichever limit is reached first
+ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", default=0.5))  # seconds
+ANSWER_FLUSH_BATCH_SIZE = int(os.getenv("ANSWER_FLUSH_BATCH_SIZE", default=200))
+
+# Answer notifications to the instructor are coalesced into this many frames per second
+ANSWER_UPDATES_PER_SECOND = float(os.getenv("ANSWER_UPDATES_PER_SECOND", default=4))
+
+# Push every question to students when the quiz starts; next_question then only carries ids
+QUIZ_PRELOAD_BUNDLE = os.getenv("QUIZ_PRELOAD_BUNDLE", default="False").lower() == "true"
+
+# Where finished sessions are graded: "local" runs grading as a task in the consumer's process,
+# "worker" sends it to the "grading" channel for `manage.py runworker grading`
+GRADING_BACKEND = os.getenv("GRADING_BACKEND", default="local")
+GRADING_MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", default=3))
+GRADING_RETRY_DELAY = float(
+    os.getenv("GRADING_RETRY_DELAY", default=1)
+)  # seconds, times the attempt
+
+# Once every session code has been handed out, codes are reused from sessions that ended
+# (or were abandoned) at least this many days ago
+SESSION_CODE_RETENTION_DAYS = int(os.getenv("SESSION_CODE_RETENTION_DAYS", default=30))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -200,6 +238,15 @@ CORS_ALLOW_HEADERS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.codec.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.codec.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
@@ -24,6 +24,11 @@ urlpatterns = [
         UpdateQuizTitleView.as_view(),
         name="quiz-update-title",
     ),
+    path(
+        "quiz/<int:quiz_id>/item-analysis/",
+        QuizItemAnalysisView.as_view(),
+        name="quiz-item-analysis",
+    ),
     path(
         "course/<uuid:course_id>/get-quizzes/",
         QuizzesByCourseView.as_view(),
@@ -125,6 +130,32 @@ urlpatterns = [
         QuizSessionResults.as_view(),
         name="quiz-session-results",
     ),
+    path(
+        "quiz-session-results/<str:code>/export/",
+        QuizSessionResultsExport.as_view(),
+        name="quiz-session-results-export",
+    ),
+    path(
+        "quiz-session-results/<str:code>/grade-distribution/",
+        QuizSessionGradeDistribution.as_view(),
+        name="quiz-session-grade-distribution",
+    ),
+    # The same results by session id, for sessions whose code has been recycled.
+    path(
+        "sessions/<int:session_id>/results/",
+        QuizSessionResults.as_view(),
+        name="session-results",
+    ),
+    path(
+        "sessions/<int:session_id>/results/export/",
+        QuizSessionResultsExport.as_view(),
+        name="session-results-export",
+    ),
+    path(
+        "sessions/<int:session_id>/results/grade-distribution/",
+        QuizSessionGradeDistribution.as_view(),
+        name="session-grade-distribution",
+    ),
     path(
         "quiz-sessions-list/",
         QuizSessionsByInstructorView.as_view(),